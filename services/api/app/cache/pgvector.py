@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import hashlib
 import json
 import os
 import re
@@ -73,6 +74,13 @@ class PgVectorCache:
                             ON cache_entries USING hnsw (embedding vector_cosine_ops);
                             """
                         )
+                        cur.execute("ALTER TABLE cache_entries ADD COLUMN IF NOT EXISTS key_hash text;")
+                        cur.execute(
+                            """
+                            CREATE INDEX IF NOT EXISTS cache_entries_key_hash_idx
+                            ON cache_entries (key_hash);
+                            """
+                        )
                     conn.commit()
                 log_event("cache_bootstrap", {"status": "ok"})
                 return
@@ -101,21 +109,31 @@ class PgVectorCache:
         try:
             with tracer.start_as_current_span("cache.lookup", attributes={"endpoint": endpoint}):
                 sanitized = sanitize_text(query_text)
-                embedding = self._embed(sanitized)
-                vector_literal = _format_vector_literal(embedding)
                 with self._connect() as conn:
                     with conn.cursor() as cur:
                         cur.execute(
                             """
-                            SELECT response, 1 - (embedding <=> %s::vector) AS similarity
+                            SELECT response, 1.0 AS similarity
                             FROM cache_entries
-                            WHERE expires_at > NOW()
-                            ORDER BY embedding <=> %s::vector
+                            WHERE key_hash = %s AND expires_at > NOW()
                             LIMIT 1;
                             """,
-                            (vector_literal, vector_literal),
+                            (_key_hash(sanitized),),
                         )
                         row = cur.fetchone()
+                        if not row:
+                            vector_literal = _format_vector_literal(self._embed(sanitized))
+                            cur.execute(
+                                """
+                                SELECT response, 1 - (embedding <=> %s::vector) AS similarity
+                                FROM cache_entries
+                                WHERE expires_at > NOW()
+                                ORDER BY embedding <=> %s::vector
+                                LIMIT 1;
+                                """,
+                                (vector_literal, vector_literal),
+                            )
+                            row = cur.fetchone()
             if not row:
                 self._emit_cache_metric(endpoint=endpoint, hit=False)
                 return None
@@ -146,11 +164,12 @@ class PgVectorCache:
                     with conn.cursor() as cur:
                         cur.execute(
                             """
-                            INSERT INTO cache_entries (id, embedding, response, expires_at)
-                            VALUES (%s, %s::vector, %s::jsonb, NOW() + (%s || ' seconds')::interval);
+                            INSERT INTO cache_entries (id, key_hash, embedding, response, expires_at)
+                            VALUES (%s, %s, %s::vector, %s::jsonb, NOW() + (%s || ' seconds')::interval);
                             """,
                             (
                                 str(uuid4()),
+                                _key_hash(sanitized),
                                 vector_literal,
                                 json.dumps(payload),
                                 self.ttl_seconds,
@@ -202,6 +221,10 @@ class PgVectorCache:
             self.rolling_cache.add(hit)
 
 
+def _key_hash(text: str) -> str:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+
 def _format_vector_literal(embedding: list[float]) -> str:
     return "[" + ",".join(f"{value:.6f}" for value in embedding) + "]"
 
@@ -8,6 +8,7 @@ from ..schemas import (
     CanonicalResponse,
     EvidenceMapEntry,
     ExplainLLMOutput,
+    ResponseMetadata,
     TriageLLMOutput,
 )
 from ..storage import StorageAdapter, build_llm_context
@@ -15,7 +16,7 @@ from .bedrock import BedrockAdapter
 from .guardrails import GuardrailReport, citation_signature, enforce_guardrails
 from .json_utils import extract_json, sanitize_llm_output
 from .prompt_registry import PromptRegistry
-from ..observability import CloudWatchMetrics, log_event, start_timer, stop_timer
+from ..observability import CW_METRICS_ENABLED, CloudWatchMetrics, log_event, start_timer, stop_timer
 from opentelemetry import trace
 
 
@@ -83,6 +84,16 @@ class LLMOrchestrator:
         completion_state = llm_output.completion_state
         if tool_calls and completion_state == "final":
             completion_state = "needs_input"
+        metadata: ResponseMetadata = {
+            "parser_version": frame.parser_version,
+            "parse_confidence": frame.parse_confidence,
+            "prompt_version": prompt_meta.metadata.get("prompt_version"),
+            "prompt_filename": prompt_meta.filename,
+            "model_id": result.model_id,
+            "token_usage": result.token_usage,
+            "guardrails": report.__dict__,
+            "category": llm_output.category,
+        }
         response = CanonicalResponse(
             request_id=request_id,
             timestamp=datetime.now(timezone.utc),
@@ -92,16 +103,7 @@ class LLMOrchestrator:
             tool_calls=tool_calls,
             hypotheses=hypotheses,
             fix_steps=llm_output.fix_steps,
-            metadata={
-                "parser_version": frame.parser_version,
-                "parse_confidence": frame.parse_confidence,
-                "prompt_version": prompt_meta.metadata.get("prompt_version"),
-                "prompt_filename": prompt_meta.filename,
-                "model_id": result.model_id,
-                "token_usage": result.token_usage,
-                "guardrails": report.__dict__,
-                "category": llm_output.category,
-            },
+            metadata=metadata,
             conversation_id=conversation_id,
         )
         latency_ms = stop_timer(timer)
@@ -185,6 +187,13 @@ class LLMOrchestrator:
         completion_state = llm_output.completion_state
         if tool_calls and completion_state == "final":
             completion_state = "needs_input"
+        metadata: ResponseMetadata = {
+            "prompt_version": prompt_meta.metadata.get("prompt_version"),
+            "prompt_filename": prompt_meta.filename,
+            "model_id": result.model_id,
+            "token_usage": result.token_usage,
+            "guardrails": report.__dict__,
+        }
         response = CanonicalResponse(
             request_id=request_id,
             timestamp=datetime.now(timezone.utc),
@@ -194,13 +203,7 @@ class LLMOrchestrator:
             tool_calls=tool_calls,
             hypotheses=hypotheses,
             fix_steps=llm_output.fix_steps,
-            metadata={
-                "prompt_version": prompt_meta.metadata.get("prompt_version"),
-                "prompt_filename": prompt_meta.filename,
-                "model_id": result.model_id,
-                "token_usage": result.token_usage,
-                "guardrails": report.__dict__,
-            },
+            metadata=metadata,
             conversation_id=conversation_id,
         )
         latency_ms = stop_timer(timer)
@@ -261,6 +264,8 @@ class LLMOrchestrator:
         guardrails: GuardrailReport,
         success: bool,
     ) -> None:
+        if not CW_METRICS_ENABLED:
+            return
         self.metrics.put_llm_metrics(
             endpoint=endpoint,
             model_id=model_id,
@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 from datetime import datetime, timezone
-from typing import List
+from typing import List, Optional
 import re
 from uuid import uuid4
 
@@ -9,7 +9,11 @@ import os
 
 from fastapi import FastAPI, Header, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from pydantic import ValidationError
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
 from .parser import RuleBasedLogParser
 from .cache import PgVectorCache
@@ -20,15 +24,16 @@ from .schemas import (
     ChatResponse,
     ChatHypothesis,
     ExplainRequest,
-    Hypothesis,
     IncidentFrame,
     StatusResponse,
     MetricsSummaryResponse,
+    ResponseMetadata,
     BudgetStatusResponse,
     TriageRequest,
 )
 from .storage import get_storage
 from .observability import (
+    CW_METRICS_ENABLED,
     CloudWatchMetrics,
     RollingCacheHitRate,
     RollingPercentiles,
@@ -63,6 +68,8 @@ metrics = CloudWatchMetrics()
 rolling_latency = RollingPercentiles(max_samples=int(os.getenv("API_LATENCY_SAMPLES", "200")))
 rolling_requests = RollingRequestWindow(window_seconds=300)
 rolling_budget_denied = RollingWindowCounter(window_seconds=300)
+llm_max_tokens = int(os.getenv("LLM_MAX_TOKENS", "800"))
+llm_cost_per_1k = float(os.getenv("LLM_COST_PER_1K_TOKENS", "0.002"))
 llm_orchestrator = LLMOrchestrator(
     storage=storage,
     parser=parser,
@@ -84,38 +91,9 @@ if cors_origins:
         allow_headers=["*"],
         expose_headers=["X-Request-Id"],
     )
-
-
-@app.middleware("http")
-async def cors_header_middleware(request: Request, call_next):
-    response = await call_next(request)
-    origin = request.headers.get("origin")
-    if origin and (origin in cors_origins or (not cors_origins and allow_all_origins)):
-        response.headers["Access-Control-Allow-Origin"] = origin
-        response.headers["Access-Control-Allow-Methods"] = "GET,POST,OPTIONS"
-        response.headers["Access-Control-Allow-Headers"] = "Content-Type,X-Request-Id,X-Api-Key"
-        response.headers["Access-Control-Expose-Headers"] = "X-Request-Id"
-        response.headers["Vary"] = "Origin"
-    return response
-
-
-@app.middleware("http")
-async def preflight_middleware(request: Request, call_next):
-    if request.method != "OPTIONS":
-        return await call_next(request)
-    origin = request.headers.get("origin")
-    if origin and (origin in cors_origins or (not cors_origins and allow_all_origins)):
-        return Response(
-            status_code=204,
-            headers={
-                "Access-Control-Allow-Origin": origin,
-                "Access-Control-Allow-Methods": "GET,POST,OPTIONS",
-                "Access-Control-Allow-Headers": "Content-Type,X-Request-Id,X-Api-Key",
-                "Access-Control-Expose-Headers": "X-Request-Id",
-                "Vary": "Origin",
-            },
-        )
-    return Response(status_code=204)
+# Registered before RequestContextMiddleware so it runs inside it: bodies are
+# compressed first, then CORS/request-id headers are stamped on the gzip response.
+app.add_middleware(GZipMiddleware, minimum_size=1024)
 
 
 @app.on_event("startup")
@@ -123,60 +101,90 @@ async def bootstrap_cache() -> None:
     cache.bootstrap()
 
 
-@app.middleware("http")
-async def request_id_middleware(request: Request, call_next):
-    request_id = request.headers.get("x-request-id") or str(uuid4())
-    request.state.request_id = request_id
-    response = await call_next(request)
-    response.headers["X-Request-Id"] = request_id
-    return response
-
-
-@app.middleware("http")
-async def request_logging_middleware(request: Request, call_next):
-    request_id = getattr(request.state, "request_id", None) or request.headers.get("x-request-id")
-    endpoint = request.url.path
-    method = request.method
-    timer = start_timer()
-    log_event(
-        "request_start",
-        {
-            "request_id": request_id,
-            "endpoint": endpoint,
-            "method": method,
-        },
-    )
-    try:
-        response = await call_next(request)
-        status_code = response.status_code
-        return response
-    except Exception as exc:
+class RequestContextMiddleware:
+    """Request id, CORS, preflight, and request logging in one ASGI pass."""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        origin = None
+        request_id = None
+        for key, value in scope["headers"]:
+            if key == b"origin":
+                origin = value.decode("latin-1")
+            elif key == b"x-request-id":
+                request_id = value.decode("latin-1")
+        request_id = request_id or str(uuid4())
+        scope.setdefault("state", {})["request_id"] = request_id
+        cors_allowed = bool(origin) and (origin in cors_origins or (not cors_origins and allow_all_origins))
+        endpoint = scope.get("root_path", "") + scope["path"]
+        method = scope["method"]
         status_code = 500
+
+        async def send_with_headers(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                headers = MutableHeaders(scope=message)
+                if cors_allowed:
+                    headers["Access-Control-Allow-Origin"] = origin
+                    headers["Access-Control-Allow-Methods"] = "GET,POST,OPTIONS"
+                    headers["Access-Control-Allow-Headers"] = "Content-Type,X-Request-Id,X-Api-Key"
+                    headers["Access-Control-Expose-Headers"] = "X-Request-Id"
+                    headers.add_vary_header("Origin")
+                headers["X-Request-Id"] = request_id
+            await send(message)
+
+        timer = start_timer()
         log_event(
-            "request_error",
-            {
-                "request_id": request_id,
-                "endpoint": endpoint,
-                "method": method,
-                "error": str(exc),
-            },
-        )
-        raise
-    finally:
-        latency_ms = stop_timer(timer)
-        rolling_latency.add(latency_ms)
-        rolling_requests.add(status_code)
-        metrics.put_api_metrics(endpoint=endpoint, status_code=status_code, latency_ms=latency_ms)
-        log_event(
-            "request_end",
+            "request_start",
             {
                 "request_id": request_id,
                 "endpoint": endpoint,
                 "method": method,
-                "status_code": status_code,
-                "latency_ms": round(latency_ms, 2),
             },
         )
+        try:
+            if method == "OPTIONS":
+                await Response(status_code=204)(scope, receive, send_with_headers)
+            else:
+                await self.app(scope, receive, send_with_headers)
+        except Exception as exc:
+            status_code = 500
+            log_event(
+                "request_error",
+                {
+                    "request_id": request_id,
+                    "endpoint": endpoint,
+                    "method": method,
+                    "error": str(exc),
+                },
+            )
+            raise
+        finally:
+            latency_ms = stop_timer(timer)
+            rolling_latency.add(latency_ms)
+            rolling_requests.add(status_code)
+            if CW_METRICS_ENABLED:
+                metrics.put_api_metrics(endpoint=endpoint, status_code=status_code, latency_ms=latency_ms)
+            log_event(
+                "request_end",
+                {
+                    "request_id": request_id,
+                    "endpoint": endpoint,
+                    "method": method,
+                    "status_code": status_code,
+                    "latency_ms": round(latency_ms, 2),
+                },
+            )
+
+
+app.add_middleware(RequestContextMiddleware)
 
 
 @app.get("/status", response_model=StatusResponse)
@@ -240,6 +248,7 @@ async def metrics_summary() -> MetricsSummaryResponse:
 
 @app.post("/triage", response_model=ChatResponse)
 async def triage(payload: TriageRequest, request: Request) -> ChatResponse:
+    now = datetime.now(timezone.utc)
     request_id = payload.request_id or request.state.request_id
     conversation_id = payload.conversation_id or request_id
     raw_text = payload.raw_text.strip()
@@ -249,6 +258,13 @@ async def triage(payload: TriageRequest, request: Request) -> ChatResponse:
     if not raw_text:
         raise HTTPException(status_code=400, detail="raw_text is required")
 
+    previous_guardrail_total = 0
+    if payload.conversation_id:
+        context = storage.get_conversation_context(conversation_id)
+        previous_guardrail_total = _previous_guardrail_total(
+            (context.get("state") or {}).get("latest_response_summary", {})
+        )
+
     log_event(
         "triage_request",
         {
@@ -262,28 +278,17 @@ async def triage(payload: TriageRequest, request: Request) -> ChatResponse:
         response, frame = _domain_guardrail_response(
             request_id=request_id,
             conversation_id=conversation_id,
+            now=now,
             frame=parser.parse(redacted_text, request_id, conversation_id),
         )
         response.metadata["client_redaction_hits"] = client_redaction_hits
         response.metadata["backend_redaction_hits"] = backend_redaction_hits
         response.metadata["input_id"] = input_id
-        _apply_guardrail_session_total(response, conversation_id)
-        storage.save_response(response)
-        storage.save_frame(frame)
-        storage.save_event(conversation_id, request_id, raw_text, frame, response, input_id)
-        storage.update_conversation_state(conversation_id, request_id, frame, response)
-        return ChatResponse(
-            request_id=response.request_id,
-            timestamp=response.timestamp,
-            assistant_message=response.assistant_message or "",
-            completion_state=response.completion_state,
-            next_question=response.next_question,
-            tool_calls=response.tool_calls,
-            hypotheses=[_to_chat_hypothesis(hyp) for hyp in response.hypotheses],
-            fix_steps=response.fix_steps,
-            metadata=_public_metadata(response.metadata),
-            conversation_id=response.conversation_id,
+        _apply_guardrail_session_total(response, previous_guardrail_total)
+        await run_in_threadpool(
+            _persist_exchange, conversation_id, request_id, raw_text, frame, response, input_id
         )
+        return _build_chat_response(response)
     if not _budget_bypass_allowed(request):
         _enforce_budget_or_raise(redacted_text)
     else:
@@ -297,28 +302,17 @@ async def triage(payload: TriageRequest, request: Request) -> ChatResponse:
         raise HTTPException(status_code=502, detail="LLM returned invalid JSON") from exc
     response.metadata["client_redaction_hits"] = client_redaction_hits
     response.metadata["backend_redaction_hits"] = backend_redaction_hits
-    _apply_guardrail_session_total(response, conversation_id)
+    _apply_guardrail_session_total(response, previous_guardrail_total)
     response.metadata["input_id"] = input_id
-    storage.save_response(response)
-    storage.save_frame(frame)
-    storage.save_event(conversation_id, request_id, raw_text, frame, response, input_id)
-    storage.update_conversation_state(conversation_id, request_id, frame, response)
-    return ChatResponse(
-        request_id=response.request_id,
-        timestamp=response.timestamp,
-        assistant_message=response.assistant_message or "",
-        completion_state=response.completion_state,
-        next_question=response.next_question,
-        tool_calls=response.tool_calls,
-        hypotheses=[_to_chat_hypothesis(hyp) for hyp in response.hypotheses],
-        fix_steps=response.fix_steps,
-        metadata=_public_metadata(response.metadata),
-        conversation_id=response.conversation_id,
+    await run_in_threadpool(
+        _persist_exchange, conversation_id, request_id, raw_text, frame, response, input_id
     )
+    return _build_chat_response(response)
 
 
 @app.post("/explain", response_model=ChatResponse)
 async def explain(payload: ExplainRequest, request: Request) -> ChatResponse:
+    now = datetime.now(timezone.utc)
     request_id = payload.request_id or request.state.request_id
     if not payload.conversation_id:
         raise HTTPException(
@@ -338,7 +332,7 @@ async def explain(payload: ExplainRequest, request: Request) -> ChatResponse:
         else:
             return ChatResponse(
                 request_id=request_id,
-                timestamp=datetime.now(timezone.utc),
+                timestamp=now,
                 assistant_message="I need the raw error or trace output to answer precisely. Paste the failing log or stack trace so I can analyze it.",
                 metadata=_public_metadata({"parser_version": "unknown"}),
                 conversation_id=conversation_id,
@@ -362,6 +356,7 @@ async def explain(payload: ExplainRequest, request: Request) -> ChatResponse:
             status_code=400,
             detail="explain requires an existing triage session; start with /triage first",
         )
+    previous_guardrail_total = _previous_guardrail_total(latest_summary)
     pending_question = (latest_summary or {}).get("next_question") or ""
     answered_pending = _answer_matches_pending(pending_question, raw_input)
     non_informative = is_non_informative(raw_input)
@@ -417,7 +412,7 @@ async def explain(payload: ExplainRequest, request: Request) -> ChatResponse:
     merged_frame = _merge_frames(frame_obj, incoming_frame)
     frame = merged_frame.model_dump()
 
-    cache_key = cache.get_explain_cache_key(IncidentFrame.model_validate(frame), redacted_input or raw_input)
+    cache_key = cache.get_explain_cache_key(merged_frame, redacted_input or raw_input)
     cache_hit = cache.lookup(endpoint="explain", query_text=cache_key)
     if cache_hit:
         cached_response = _hydrate_cached_response(
@@ -425,21 +420,21 @@ async def explain(payload: ExplainRequest, request: Request) -> ChatResponse:
             request_id=request_id,
             conversation_id=conversation_id,
             similarity=cache_hit.similarity,
+            now=now,
         )
         cached_response.metadata["client_redaction_hits"] = client_redaction_hits
         cached_response.metadata["backend_redaction_hits"] = backend_redaction_hits
-        _apply_guardrail_session_total(cached_response, conversation_id)
-        storage.save_frame(merged_frame)
-        storage.save_response(cached_response)
-        storage.save_event(
+        _apply_guardrail_session_total(cached_response, previous_guardrail_total)
+        await run_in_threadpool(
+            _persist_exchange,
             conversation_id,
             request_id,
             redacted_input or raw_input,
             incoming_frame,
             cached_response,
-            input_id=cached_response.request_id,
+            cached_response.request_id,
+            merged_frame,
         )
-        storage.update_conversation_state(conversation_id, request_id, merged_frame, cached_response)
         log_event(
             "cache_hit",
             {
@@ -448,18 +443,7 @@ async def explain(payload: ExplainRequest, request: Request) -> ChatResponse:
                 "similarity": cache_hit.similarity,
             },
         )
-        return ChatResponse(
-            request_id=cached_response.request_id,
-            timestamp=cached_response.timestamp,
-            assistant_message=cached_response.assistant_message or "",
-            completion_state=cached_response.completion_state,
-            next_question=cached_response.next_question,
-            tool_calls=cached_response.tool_calls,
-            hypotheses=[_to_chat_hypothesis(hyp) for hyp in cached_response.hypotheses],
-            fix_steps=cached_response.fix_steps,
-            metadata=_public_metadata(cached_response.metadata),
-            conversation_id=cached_response.conversation_id,
-        )
+        return _build_chat_response(cached_response)
 
     if not _budget_bypass_allowed(request):
         _enforce_budget_or_raise(cache_key)
@@ -482,9 +466,10 @@ async def explain(payload: ExplainRequest, request: Request) -> ChatResponse:
     response.metadata["backend_redaction_hits"] = backend_redaction_hits
     if tool_results:
         response.metadata["tool_results"] = [result.model_dump() for result in tool_results]
-    _apply_guardrail_session_total(response, conversation_id)
+    _apply_guardrail_session_total(response, previous_guardrail_total)
+    pending_norm = _normalize_text(pending_question or "")
     if pending_question and response.next_question and raw_input:
-        if _normalize_text(response.next_question) == _normalize_text(pending_question):
+        if _normalize_text(response.next_question) == pending_norm:
             if missing_details:
                 response.next_question = rephrase_missing_details(missing_details)
                 response.completion_state = "needs_input"
@@ -493,10 +478,10 @@ async def explain(payload: ExplainRequest, request: Request) -> ChatResponse:
                 if response.completion_state == "needs_input":
                     response.completion_state = "final"
     if answered_pending and pending_question:
-        if response.next_question and _normalize_text(response.next_question) == _normalize_text(pending_question):
+        if response.next_question and _normalize_text(response.next_question) == pending_norm:
             response.next_question = None
         message_norm = _normalize_text(response.assistant_message or "")
-        if message_norm == _normalize_text(pending_question):
+        if message_norm == pending_norm:
             response.assistant_message = "Thanks - got it. Proceeding with the analysis."
     if pending_question and raw_input and missing_details:
         if not response.next_question:
@@ -504,99 +489,103 @@ async def explain(payload: ExplainRequest, request: Request) -> ChatResponse:
             response.completion_state = "needs_input"
         message_norm = _normalize_text(response.assistant_message or "")
         if message_norm and (
-            message_norm == normalize_text(pending_question)
-            or message_norm == normalize_text(response.next_question or "")
+            message_norm == pending_norm
+            or message_norm == _normalize_text(response.next_question or "")
         ):
             response.assistant_message = "Thanks — I still need one detail to proceed."
     if pending_question and raw_input:
-        pending_norm = normalize_text(pending_question)
-        message_norm = normalize_text(response.assistant_message or "")
+        message_norm = _normalize_text(response.assistant_message or "")
         if message_norm and (message_norm == pending_norm or pending_norm in message_norm):
             if not (response.hypotheses or response.fix_steps):
                 response.assistant_message = (
                     "Thanks - proceeding with a best-effort analysis based on the available info."
                 )
-    storage.save_frame(merged_frame)
-    storage.save_response(response)
-    storage.save_event(
+    await run_in_threadpool(
+        _persist_exchange,
         conversation_id,
         request_id,
         redacted_input or raw_input,
         incoming_frame,
         response,
-        input_id=response.request_id,
+        response.request_id,
+        merged_frame,
     )
-    storage.update_conversation_state(conversation_id, request_id, merged_frame, response)
     cache.put(endpoint="explain", query_text=cache_key, response=response)
-    return ChatResponse(
-        request_id=response.request_id,
-        timestamp=response.timestamp,
-        assistant_message=response.assistant_message or "",
-        completion_state=response.completion_state,
-        next_question=response.next_question,
-        tool_calls=response.tool_calls,
-        hypotheses=[_to_chat_hypothesis(hyp) for hyp in response.hypotheses],
-        fix_steps=response.fix_steps,
-        metadata=_public_metadata(response.metadata),
-        conversation_id=response.conversation_id,
-    )
+    return _build_chat_response(response)
 
 
-def _public_metadata(metadata: dict) -> dict:
-    token_usage = metadata.get("token_usage") if isinstance(metadata, dict) else {}
-    total_tokens = 0
-    if isinstance(token_usage, dict):
-        total_tokens = int(token_usage.get("total_tokens", 0))
-    cost_per_1k = float(os.getenv("LLM_COST_PER_1K_TOKENS", "0.002"))
-    cost_estimate = round((total_tokens / 1000.0) * cost_per_1k, 6) if total_tokens else None
-    guardrails = metadata.get("guardrails") if isinstance(metadata, dict) else {}
-    guardrail_missing = None
-    guardrail_redactions = None
-    guardrail_domain = None
-    guardrail_hits = None
-    if isinstance(guardrails, dict):
+def _persist_exchange(
+    conversation_id: str,
+    request_id: str,
+    raw_text: str,
+    event_frame: IncidentFrame,
+    response: CanonicalResponse,
+    input_id: str,
+    state_frame: Optional[IncidentFrame] = None,
+) -> None:
+    # Runs off the event loop; the writes go out as one coalesced batch.
+    state_frame = state_frame or event_frame
+    with storage.batch_writes():
+        storage.save_frame(state_frame)
+        storage.save_response(response)
+        storage.save_event(conversation_id, request_id, raw_text, event_frame, response, input_id=input_id)
+        storage.update_conversation_state(conversation_id, request_id, state_frame, response)
+
+
+def _public_metadata(metadata: ResponseMetadata) -> dict:
+    token_usage = metadata.get("token_usage")
+    total_tokens = _safe_int(token_usage.get("total_tokens")) if token_usage else 0
+    cost_estimate = round((total_tokens / 1000.0) * llm_cost_per_1k, 6) if total_tokens else None
+    guardrails = metadata.get("guardrails")
+    if guardrails is None:
+        guardrail_missing = guardrail_redactions = guardrail_domain = guardrail_hits = None
+    else:
         guardrail_missing = guardrails.get("citation_missing_count")
         guardrail_redactions = guardrails.get("redactions")
         guardrail_domain = guardrails.get("domain_restricted")
-        try:
-            guardrail_hits = (
-                int(guardrail_missing or 0)
-                + int(guardrail_redactions or 0)
-                + int(guardrail_domain or 0)
-            )
-        except (TypeError, ValueError):
-            guardrail_hits = None
-    guardrail_hits_session = metadata.get("guardrail_hits_session") if isinstance(metadata, dict) else None
-    client_redaction_hits = metadata.get("client_redaction_hits") if isinstance(metadata, dict) else None
-    backend_redaction_hits = metadata.get("backend_redaction_hits") if isinstance(metadata, dict) else None
+        guardrail_hits = (
+            _safe_int(guardrail_missing)
+            + _safe_int(guardrail_redactions)
+            + _safe_int(guardrail_domain)
+        )
     return {
         "token_usage": token_usage,
-        "cache_hit": metadata.get("cache_hit") if isinstance(metadata, dict) else None,
-        "cache_similarity": metadata.get("cache_similarity") if isinstance(metadata, dict) else None,
+        "cache_hit": metadata.get("cache_hit"),
+        "cache_similarity": metadata.get("cache_similarity"),
         "cost_estimate_usd": cost_estimate,
         "guardrail_missing": guardrail_missing,
         "guardrail_redactions": guardrail_redactions,
         "guardrail_domain": guardrail_domain,
         "guardrail_hits": guardrail_hits,
-        "guardrail_hits_session": guardrail_hits_session,
-        "client_redaction_hits": client_redaction_hits,
-        "backend_redaction_hits": backend_redaction_hits,
+        "guardrail_hits_session": metadata.get("guardrail_hits_session"),
+        "client_redaction_hits": metadata.get("client_redaction_hits"),
+        "backend_redaction_hits": metadata.get("backend_redaction_hits"),
     }
 
 
-def _to_chat_hypothesis(hypothesis: Hypothesis) -> ChatHypothesis:
-    return ChatHypothesis(
-        id=hypothesis.id,
-        confidence=hypothesis.confidence,
-        explanation=hypothesis.explanation,
+def _build_chat_response(response: CanonicalResponse) -> ChatResponse:
+    return ChatResponse.model_construct(
+        request_id=response.request_id,
+        timestamp=response.timestamp,
+        assistant_message=response.assistant_message or "",
+        completion_state=response.completion_state,
+        next_question=response.next_question,
+        tool_calls=response.tool_calls,
+        hypotheses=[
+            ChatHypothesis.model_construct(id=hyp.id, confidence=hyp.confidence, explanation=hyp.explanation)
+            for hyp in response.hypotheses
+        ],
+        fix_steps=response.fix_steps,
+        metadata=_public_metadata(response.metadata),
+        conversation_id=response.conversation_id,
     )
 
 
 def _merge_frames(existing: IncidentFrame, incoming: IncidentFrame) -> IncidentFrame:
     primary = incoming.primary_error_signature or existing.primary_error_signature
-    secondary = list({*existing.secondary_signatures, *incoming.secondary_signatures})
-    services = list({*existing.services, *incoming.services})
-    infra = list({*existing.infra_components, *incoming.infra_components})
+    secondary = _merge_unique(existing.secondary_signatures, incoming.secondary_signatures)
+    services = _merge_unique(existing.services, incoming.services)
+    infra = _merge_unique(existing.infra_components, incoming.infra_components)
     evidence = [*existing.evidence_map, *incoming.evidence_map]
     return IncidentFrame(
         frame_id=incoming.frame_id,
@@ -616,17 +605,24 @@ def _merge_frames(existing: IncidentFrame, incoming: IncidentFrame) -> IncidentF
     )
 
 
+def _merge_unique(existing: List[str], incoming: List[str]) -> List[str]:
+    if not existing or not incoming:
+        return list(dict.fromkeys(existing or incoming))
+    return list(dict.fromkeys((*existing, *incoming)))
+
+
 def _hydrate_cached_response(
     cached: CanonicalResponse,
     *,
     request_id: str,
     conversation_id: str,
     similarity: float,
+    now: datetime,
 ) -> CanonicalResponse:
     payload = cached.model_dump()
     payload["request_id"] = request_id
     payload["conversation_id"] = conversation_id
-    payload["timestamp"] = datetime.now(timezone.utc)
+    payload["timestamp"] = now
     metadata = payload.get("metadata") or {}
     metadata.update(
         {
@@ -640,8 +636,9 @@ def _hydrate_cached_response(
 
 
 def _enforce_budget_or_raise(text: str) -> None:
-    max_tokens = int(os.getenv("LLM_MAX_TOKENS", "800"))
-    estimated_tokens = estimate_tokens(text, max_tokens=max_tokens)
+    if not budget.enabled:
+        return
+    estimated_tokens = estimate_tokens(text, max_tokens=llm_max_tokens)
     decision = budget.enforce(estimated_tokens=estimated_tokens)
     if decision.allowed:
         return
@@ -665,41 +662,37 @@ def _budget_bypass_allowed(request: Request) -> bool:
     return header in ("1", "true", "yes")
 
 
-def _apply_guardrail_session_total(response: CanonicalResponse, conversation_id: str) -> None:
-    context = storage.get_conversation_context(conversation_id)
-    latest_summary = (context.get("state") or {}).get("latest_response_summary", {})
-    previous_total = 0
+def _previous_guardrail_total(latest_summary: object) -> int:
     if isinstance(latest_summary, dict):
-        previous_total = int(latest_summary.get("guardrail_hits_session") or 0)
+        return _safe_int(latest_summary.get("guardrail_hits_session"))
+    return 0
+
+
+def _apply_guardrail_session_total(response: CanonicalResponse, previous_total: int) -> None:
     current = _compute_guardrail_hits_current(response.metadata)
     response.metadata["guardrail_hits_session"] = previous_total + current
 
 
-def _compute_guardrail_hits_current(metadata: dict) -> int:
-    if not isinstance(metadata, dict):
-        return 0
+def _compute_guardrail_hits_current(metadata: ResponseMetadata) -> int:
     guardrails = metadata.get("guardrails") or {}
-    missing = 0
-    redactions = 0
-    domain_restricted = 0
-    if isinstance(guardrails, dict):
-        try:
-            missing = int(guardrails.get("citation_missing_count") or 0)
-            redactions = int(guardrails.get("redactions") or 0)
-            domain_restricted = int(guardrails.get("domain_restricted") or 0)
-        except (TypeError, ValueError):
-            missing = 0
-            redactions = 0
-            domain_restricted = 0
-    try:
-        client_hits = int(metadata.get("client_redaction_hits") or 0)
-    except (TypeError, ValueError):
-        client_hits = 0
+    return (
+        _safe_int(guardrails.get("citation_missing_count"))
+        + _safe_int(guardrails.get("redactions"))
+        + _safe_int(guardrails.get("domain_restricted"))
+        + _safe_int(metadata.get("client_redaction_hits"))
+        + _safe_int(metadata.get("backend_redaction_hits"))
+    )
+
+
+def _safe_int(value: object) -> int:
+    if isinstance(value, int):
+        return value
+    if isinstance(value, str) and value.isdigit():
+        return int(value)
     try:
-        backend_hits = int(metadata.get("backend_redaction_hits") or 0)
+        return int(value or 0)
     except (TypeError, ValueError):
-        backend_hits = 0
-    return missing + redactions + domain_restricted + client_hits + backend_hits
+        return 0
 
 
 def redact_sensitive_text(text: str) -> tuple[str, int]:
@@ -731,11 +724,12 @@ def _domain_guardrail_response(
     *,
     request_id: str,
     conversation_id: str,
+    now: datetime,
     frame: IncidentFrame,
 ) -> tuple[CanonicalResponse, IncidentFrame]:
     response = CanonicalResponse(
         request_id=request_id,
-        timestamp=datetime.now(timezone.utc),
+        timestamp=now,
         assistant_message=(
             "Please ask a coding, infrastructure as code, or CI/CD automation question so I can help."
         ),
@@ -1,15 +1,23 @@
 from __future__ import annotations
 
+import atexit
 import json
 import logging
 import os
+import queue
+import threading
 import time
+from array import array
+from bisect import bisect_left, insort
 from collections import deque
-from datetime import datetime, timedelta, timezone
+from datetime import datetime, timezone
+from functools import lru_cache, wraps
 from math import floor
-from typing import Deque, Dict, Iterable, Optional
+from typing import Any, Callable, Deque, Dict, Iterable, Iterator, List, Optional, Tuple
 
 import boto3
+import orjson
+from botocore.config import Config
 
 from opentelemetry import trace
 from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
@@ -22,6 +30,20 @@ from opentelemetry.sdk.trace import TracerProvider
 from opentelemetry.sdk.trace.export import BatchSpanProcessor
 
 
+__all__ = [
+    "CW_METRICS_ENABLED",
+    "CloudWatchMetrics",
+    "RollingCacheHitRate",
+    "RollingPercentiles",
+    "RollingRequestWindow",
+    "RollingWindowCounter",
+    "configure_tracing",
+    "log_event",
+    "start_timer",
+    "stop_timer",
+]
+
+
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
 LOGGER = logging.getLogger("troubleshooter")
 if not LOGGER.handlers:
@@ -32,12 +54,136 @@ LOGGER.setLevel(LOG_LEVEL)
 
 _TRACE_CONFIGURED = False
 
+UTC = timezone.utc
+
+CW_METRICS_ENABLED = os.getenv("CW_METRICS_ENABLED", "false").lower() == "true"
+CW_MAX_DATUMS_PER_CALL = 1000
+CW_MAX_PAYLOAD_BYTES = 700_000
+CW_QUEUE_MAXSIZE = 10_000
+CW_MAX_QUERIES_PER_CALL = 500
+CW_MAX_VALUES_PER_DATUM = 150
+
+
+CW_CLIENT_CONFIG = Config(
+    max_pool_connections=50,
+    retries={"max_attempts": 10, "mode": "adaptive"},
+    tcp_keepalive=True,
+    connect_timeout=2,
+    read_timeout=5,
+)
+
+
+@lru_cache(maxsize=1)
+def _cloudwatch_client():
+    return boto3.client("cloudwatch", config=CW_CLIENT_CONFIG)
+
+
+@lru_cache(maxsize=256)
+def _llm_dimensions(endpoint: str, model_id: str) -> Tuple[dict, ...]:
+    return ({"Name": "Endpoint", "Value": endpoint}, {"Name": "ModelId", "Value": model_id})
+
+
+@lru_cache(maxsize=256)
+def _api_dimensions(endpoint: str, status_code: int) -> Tuple[dict, ...]:
+    return ({"Name": "Endpoint", "Value": endpoint}, {"Name": "StatusCode", "Value": str(status_code)})
+
+
+@lru_cache(maxsize=256)
+def _endpoint_dimensions(endpoint: str) -> Tuple[dict, ...]:
+    return ({"Name": "Endpoint", "Value": endpoint},)
+
+
+def _period_cached(method: Callable[..., Any]) -> Callable[..., Any]:
+    @wraps(method)
+    def wrapper(self: "CloudWatchMetrics", **kwargs: Any) -> Any:
+        if "endpoints" in kwargs:
+            kwargs["endpoints"] = tuple(kwargs["endpoints"])
+        key = (method.__name__, tuple(sorted(kwargs.items())))
+        window_end = _window_end(kwargs.get("period", 60))
+        cached = self._query_cache.get(key)
+        if cached and cached[0] == window_end:
+            return cached[1]
+        try:
+            value = method(self, **kwargs)
+        except Exception as exc:
+            # Failed reads are not cached, so the next call retries instead of serving None all period.
+            log_event("metrics_summary_error", {"error": str(exc), "source": "cloudwatch"})
+            return None
+        self._query_cache[key] = (window_end, value)
+        return value
+
+    return wrapper
+
+
+def _window_end(period: int) -> int:
+    return (int(time.time()) // period) * period
+
+
+def _query_window(minutes: int, period: int) -> Tuple[datetime, datetime]:
+    end_ts = _window_end(period)
+    start_ts = end_ts - min(minutes * 60, period * 3)
+    return datetime.fromtimestamp(start_ts, UTC), datetime.fromtimestamp(end_ts, UTC)
+
 
 class CloudWatchMetrics:
     def __init__(self) -> None:
-        self.enabled = os.getenv("CW_METRICS_ENABLED", "false").lower() == "true"
+        self.enabled = CW_METRICS_ENABLED
         self.namespace = os.getenv("CW_METRICS_NAMESPACE", "Troubleshooter/LLM")
-        self.client = boto3.client("cloudwatch") if self.enabled else None
+        self.client = _cloudwatch_client() if self.enabled else None
+        self.flush_interval = float(os.getenv("CW_METRICS_FLUSH_SECONDS", "10"))
+        self._queue: queue.Queue[List[dict]] = queue.Queue(maxsize=CW_QUEUE_MAXSIZE)
+        self._dropped = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._query_cache: Dict[tuple, Tuple[int, Any]] = {}
+        if self.enabled:
+            threading.Thread(target=self._flush_loop, name="cloudwatch-metrics-flush", daemon=True).start()
+            atexit.register(self.close)
+
+    def close(self) -> None:
+        self._stop.set()
+        self.flush()
+
+    def flush(self) -> None:
+        pending: List[dict] = []
+        while True:
+            try:
+                pending.extend(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        with self._lock:
+            dropped, self._dropped = self._dropped, 0
+        if dropped:
+            log_event("metrics_dropped", {"count": dropped})
+            pending.append(
+                {
+                    "MetricName": "MetricsDropped",
+                    "Unit": "Count",
+                    "Value": dropped,
+                    "Timestamp": time.time(),
+                }
+            )
+        if not pending:
+            return
+        for chunk in _chunk_metric_data(_aggregate_metric_data(pending)):
+            try:
+                self.client.put_metric_data(Namespace=self.namespace, MetricData=chunk)
+            except Exception as exc:
+                log_event("metrics_flush_error", {"error": str(exc), "datums": len(chunk)})
+
+    def _flush_loop(self) -> None:
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def _enqueue(self, metric_data: List[dict]) -> None:
+        timestamp = time.time()
+        for datum in metric_data:
+            datum["Timestamp"] = timestamp
+        try:
+            self._queue.put_nowait(metric_data)
+        except queue.Full:
+            with self._lock:
+                self._dropped += 1
 
     def put_llm_metrics(
         self,
@@ -52,10 +198,7 @@ class CloudWatchMetrics:
     ) -> None:
         if not self.enabled or not self.client:
             return
-        dimensions = [
-            {"Name": "Endpoint", "Value": endpoint},
-            {"Name": "ModelId", "Value": model_id},
-        ]
+        dimensions = _llm_dimensions(endpoint, model_id)
         metric_data = [
             {
                 "MetricName": "LLMRequests",
@@ -100,24 +243,18 @@ class CloudWatchMetrics:
                 "Value": guardrail_redactions,
             },
         ]
-        self.client.put_metric_data(Namespace=self.namespace, MetricData=metric_data)
+        self._enqueue(metric_data)
 
     def put_cache_metrics(self, *, endpoint: str, hit: bool) -> None:
         if not self.enabled or not self.client:
             return
-        dimensions = [{"Name": "Endpoint", "Value": endpoint}]
+        dimensions = _endpoint_dimensions(endpoint)
         metric_data = [
             {
-                "MetricName": "CacheHitCount",
+                "MetricName": "CacheHitCount" if hit else "CacheMissCount",
                 "Dimensions": dimensions,
                 "Unit": "Count",
-                "Value": 1 if hit else 0,
-            },
-            {
-                "MetricName": "CacheMissCount",
-                "Dimensions": dimensions,
-                "Unit": "Count",
-                "Value": 0 if hit else 1,
+                "Value": 1,
             },
             {
                 "MetricName": "CacheHitRate",
@@ -126,29 +263,25 @@ class CloudWatchMetrics:
                 "Value": 1 if hit else 0,
             },
         ]
-        self.client.put_metric_data(Namespace=self.namespace, MetricData=metric_data)
+        self._enqueue(metric_data)
 
     def put_budget_denied(self) -> None:
         if not self.enabled or not self.client:
             return
-        self.client.put_metric_data(
-            Namespace=self.namespace,
-            MetricData=[
+        self._enqueue(
+            [
                 {
                     "MetricName": "BudgetDeniedCount",
                     "Unit": "Count",
                     "Value": 1,
                 }
-            ],
+            ]
         )
 
     def put_api_metrics(self, *, endpoint: str, status_code: int, latency_ms: float) -> None:
         if not self.enabled or not self.client:
             return
-        dimensions = [
-            {"Name": "Endpoint", "Value": endpoint},
-            {"Name": "StatusCode", "Value": str(status_code)},
-        ]
+        dimensions = _api_dimensions(endpoint, status_code)
         metric_data = [
             {
                 "MetricName": "APIRequestCount",
@@ -169,8 +302,28 @@ class CloudWatchMetrics:
                 "Value": 1 if status_code >= 400 else 0,
             },
         ]
-        self.client.put_metric_data(Namespace=self.namespace, MetricData=metric_data)
-
+        self._enqueue(metric_data)
+
+    def _get_metric_data(self, queries: List[dict], start_time: datetime, end_time: datetime) -> List[dict]:
+        paginator = self.client.get_paginator("get_metric_data")
+        merged: Dict[str, dict] = {}
+        for offset in range(0, len(queries), CW_MAX_QUERIES_PER_CALL):
+            pages = paginator.paginate(
+                MetricDataQueries=queries[offset : offset + CW_MAX_QUERIES_PER_CALL],
+                StartTime=start_time,
+                EndTime=end_time,
+                ScanBy="TimestampDescending",
+            )
+            for page in pages:
+                for result in page.get("MetricDataResults", []):
+                    existing = merged.get(result.get("Id", ""))
+                    if existing is None:
+                        merged[result.get("Id", "")] = {**result, "Values": list(result.get("Values") or [])}
+                    else:
+                        existing["Values"].extend(result.get("Values") or [])
+        return list(merged.values())
+
+    @_period_cached
     def get_api_latency_percentiles(
         self,
         *,
@@ -182,96 +335,45 @@ class CloudWatchMetrics:
         if not self.enabled or not self.client:
             return None
 
-        queries = []
-        for idx, endpoint in enumerate(endpoints):
-            for stat in ("p50", "p95"):
-                queries.append(
-                    {
-                        "Id": f"{stat}_{idx}",
-                        "MetricStat": {
-                            "Metric": {
-                                "Namespace": self.namespace,
-                                "MetricName": "APILatencyMs",
-                                "Dimensions": [
-                                    {"Name": "Endpoint", "Value": endpoint},
-                                    {"Name": "StatusCode", "Value": status_code},
-                                ],
-                            },
-                            "Period": period,
-                            "Stat": stat,
-                        },
-                        "ReturnData": True,
-                    }
-                )
-
-        if not queries:
-            return None
-
-        end_time = datetime.now(timezone.utc)
-        start_time = end_time - timedelta(minutes=minutes)
-        try:
-            response = self.client.get_metric_data(
-                MetricDataQueries=queries,
-                StartTime=start_time,
-                EndTime=end_time,
-                ScanBy="TimestampDescending",
-                MaxDatapoints=100,
-            )
-            results = response.get("MetricDataResults", [])
-        except Exception as exc:
-            log_event("metrics_summary_error", {"error": str(exc), "source": "cloudwatch"})
-            return None
-        p50_values = []
-        p95_values = []
-        for result in results:
-            values = result.get("Values") or []
-            if not values:
-                continue
-            latest = values[0]
-            if result.get("Id", "").startswith("p50"):
-                p50_values.append(latest)
-            elif result.get("Id", "").startswith("p95"):
-                p95_values.append(latest)
-
-        if not p50_values and not p95_values:
-            return None
-
-        return {
-            "p50": max(p50_values) if p50_values else None,
-            "p95": max(p95_values) if p95_values else None,
-        }
+        metrics = [
+            {
+                "Namespace": self.namespace,
+                "MetricName": "APILatencyMs",
+                "Dimensions": [
+                    {"Name": "Endpoint", "Value": endpoint},
+                    {"Name": "StatusCode", "Value": status_code},
+                ],
+            }
+            for endpoint in endpoints
+        ]
+        return self._max_percentiles(metrics, minutes=minutes, period=period)
 
+    @_period_cached
     def get_cache_hit_rate(self, *, endpoint: str = "explain", minutes: int = 15, period: int = 60) -> Optional[float]:
         if not self.enabled or not self.client:
             return None
-        end_time = datetime.now(timezone.utc)
-        start_time = end_time - timedelta(minutes=minutes)
-        try:
-            response = self.client.get_metric_data(
-                MetricDataQueries=[
-                    {
-                        "Id": "cache_hit_rate",
-                        "MetricStat": {
-                            "Metric": {
-                                "Namespace": self.namespace,
-                                "MetricName": "CacheHitRate",
-                                "Dimensions": [{"Name": "Endpoint", "Value": endpoint}],
-                            },
-                            "Period": period,
-                            "Stat": "Average",
+        start_time, end_time = _query_window(minutes, period)
+        response = self.client.get_metric_data(
+            MetricDataQueries=[
+                {
+                    "Id": "cache_hit_rate",
+                    "MetricStat": {
+                        "Metric": {
+                            "Namespace": self.namespace,
+                            "MetricName": "CacheHitRate",
+                            "Dimensions": [{"Name": "Endpoint", "Value": endpoint}],
                         },
-                        "ReturnData": True,
-                    }
-                ],
-                StartTime=start_time,
-                EndTime=end_time,
-                ScanBy="TimestampDescending",
-                MaxDatapoints=50,
-            )
-            results = response.get("MetricDataResults", [])
-        except Exception as exc:
-            log_event("metrics_summary_error", {"error": str(exc), "source": "cloudwatch"})
-            return None
+                        "Period": period,
+                        "Stat": "Average",
+                    },
+                    "ReturnData": True,
+                }
+            ],
+            StartTime=start_time,
+            EndTime=end_time,
+            ScanBy="TimestampDescending",
+        )
+        results = response.get("MetricDataResults", [])
         if not results:
             return None
         values = results[0].get("Values") or []
@@ -279,6 +381,7 @@ class CloudWatchMetrics:
             return None
         return values[0]
 
+    @_period_cached
     def get_api_error_rate(
         self,
         *,
@@ -321,20 +424,8 @@ class CloudWatchMetrics:
                 }
             )
 
-        end_time = datetime.now(timezone.utc)
-        start_time = end_time - timedelta(minutes=minutes)
-        try:
-            response = self.client.get_metric_data(
-                MetricDataQueries=queries,
-                StartTime=start_time,
-                EndTime=end_time,
-                ScanBy="TimestampDescending",
-                MaxDatapoints=100,
-            )
-            results = response.get("MetricDataResults", [])
-        except Exception as exc:
-            log_event("metrics_summary_error", {"error": str(exc), "source": "cloudwatch"})
-            return None
+        start_time, end_time = _query_window(minutes, period)
+        results = self._get_metric_data(queries, start_time, end_time)
 
         if not results:
             return None
@@ -352,36 +443,31 @@ class CloudWatchMetrics:
             return None
         return totals["err"] / totals["req"]
 
+    @_period_cached
     def get_budget_denied_count(self, *, minutes: int = 15, period: int = 60) -> Optional[float]:
         if not self.enabled or not self.client:
             return None
-        end_time = datetime.now(timezone.utc)
-        start_time = end_time - timedelta(minutes=minutes)
-        try:
-            response = self.client.get_metric_data(
-                MetricDataQueries=[
-                    {
-                        "Id": "budget_denied",
-                        "MetricStat": {
-                            "Metric": {
-                                "Namespace": self.namespace,
-                                "MetricName": "BudgetDeniedCount",
-                            },
-                            "Period": period,
-                            "Stat": "Sum",
+        start_time, end_time = _query_window(minutes, period)
+        response = self.client.get_metric_data(
+            MetricDataQueries=[
+                {
+                    "Id": "budget_denied",
+                    "MetricStat": {
+                        "Metric": {
+                            "Namespace": self.namespace,
+                            "MetricName": "BudgetDeniedCount",
                         },
-                        "ReturnData": True,
-                    }
-                ],
-                StartTime=start_time,
-                EndTime=end_time,
-                ScanBy="TimestampDescending",
-                MaxDatapoints=50,
-            )
-            results = response.get("MetricDataResults", [])
-        except Exception as exc:
-            log_event("metrics_summary_error", {"error": str(exc), "source": "cloudwatch"})
-            return None
+                        "Period": period,
+                        "Stat": "Sum",
+                    },
+                    "ReturnData": True,
+                }
+            ],
+            StartTime=start_time,
+            EndTime=end_time,
+            ScanBy="TimestampDescending",
+        )
+        results = response.get("MetricDataResults", [])
         if not results:
             return None
         values = results[0].get("Values") or []
@@ -389,6 +475,7 @@ class CloudWatchMetrics:
             return None
         return values[0]
 
+    @_period_cached
     def get_llm_latency_percentiles(
         self,
         *,
@@ -399,23 +486,45 @@ class CloudWatchMetrics:
         if not self.enabled or not self.client:
             return None
 
+        metrics = [
+            {
+                "Namespace": self.namespace,
+                "MetricName": "LLMLatencyMs",
+                "Dimensions": [
+                    {"Name": "Endpoint", "Value": endpoint},
+                ],
+            }
+            for endpoint in endpoints
+        ]
+        return self._max_percentiles(metrics, minutes=minutes, period=period)
+
+    def _max_percentiles(
+        self,
+        metrics: List[dict],
+        *,
+        minutes: int,
+        period: int,
+    ) -> Optional[Dict[str, Optional[float]]]:
         queries = []
-        for idx, endpoint in enumerate(endpoints):
+        group_size = (CW_MAX_QUERIES_PER_CALL - 2) // 2
+        for group, offset in enumerate(range(0, len(metrics), group_size)):
             for stat in ("p50", "p95"):
+                ids = []
+                for idx, metric in enumerate(metrics[offset : offset + group_size], start=offset):
+                    ids.append(f"{stat}_{idx}")
+                    queries.append(
+                        {
+                            "Id": ids[-1],
+                            "MetricStat": {"Metric": metric, "Period": period, "Stat": stat},
+                            "ReturnData": False,
+                        }
+                    )
                 queries.append(
                     {
-                        "Id": f"{stat}_{idx}",
-                        "MetricStat": {
-                            "Metric": {
-                                "Namespace": self.namespace,
-                                "MetricName": "LLMLatencyMs",
-                                "Dimensions": [
-                                    {"Name": "Endpoint", "Value": endpoint},
-                                ],
-                            },
-                            "Period": period,
-                            "Stat": stat,
-                        },
+                        "Id": f"{stat}_max_{group}",
+                        # FILL carries each endpoint's last datapoint forward so an idle endpoint
+                        # still counts toward the latest timestamp's max.
+                        "Expression": f"MAX([{', '.join(f'FILL({id_}, REPEAT)' for id_ in ids)}])",
                         "ReturnData": True,
                     }
                 )
@@ -423,121 +532,178 @@ class CloudWatchMetrics:
         if not queries:
             return None
 
-        end_time = datetime.now(timezone.utc)
-        start_time = end_time - timedelta(minutes=minutes)
-        try:
-            response = self.client.get_metric_data(
-                MetricDataQueries=queries,
-                StartTime=start_time,
-                EndTime=end_time,
-                ScanBy="TimestampDescending",
-                MaxDatapoints=100,
-            )
-            results = response.get("MetricDataResults", [])
-        except Exception as exc:
-            log_event("metrics_summary_error", {"error": str(exc), "source": "cloudwatch"})
-            return None
+        start_time, end_time = _query_window(minutes, period)
+        results = self._get_metric_data(queries, start_time, end_time)
 
-        p50_values = []
-        p95_values = []
+        latest: Dict[str, List[float]] = {"p50": [], "p95": []}
         for result in results:
-            values = result.get("Values") or []
-            if not values:
-                continue
-            latest = values[0]
-            if result.get("Id", "").startswith("p50"):
-                p50_values.append(latest)
-            elif result.get("Id", "").startswith("p95"):
-                p95_values.append(latest)
-
-        if not p50_values and not p95_values:
+            values = result.get("Values")
+            if values:
+                latest[result["Id"][:3]].append(values[0])
+        if not latest["p50"] and not latest["p95"]:
             return None
+        return {stat: max(values) if values else None for stat, values in latest.items()}
 
-        return {
-            "p50": max(p50_values) if p50_values else None,
-            "p95": max(p95_values) if p95_values else None,
-        }
+
+def _aggregate_metric_data(metric_data: List[dict]) -> List[dict]:
+    groups: Dict[tuple, Dict[float, int]] = {}
+    for datum in metric_data:
+        key = (
+            datum["MetricName"],
+            datum["Unit"],
+            tuple((dimension["Name"], dimension["Value"]) for dimension in datum.get("Dimensions") or ()),
+            int(datum["Timestamp"]) // 60 * 60,
+        )
+        counts = groups.setdefault(key, {})
+        value = float(datum["Value"])
+        counts[value] = counts.get(value, 0) + 1
+    aggregated: List[dict] = []
+    for (name, unit, dimensions, timestamp), counts in groups.items():
+        values = list(counts)
+        minute = datetime.fromtimestamp(timestamp, UTC)
+        for offset in range(0, len(values), CW_MAX_VALUES_PER_DATUM):
+            chunk = values[offset : offset + CW_MAX_VALUES_PER_DATUM]
+            datum = {
+                "MetricName": name,
+                "Unit": unit,
+                "Timestamp": minute,
+                "Values": chunk,
+                "Counts": [float(counts[value]) for value in chunk],
+            }
+            if dimensions:
+                datum["Dimensions"] = [{"Name": dim_name, "Value": dim_value} for dim_name, dim_value in dimensions]
+            aggregated.append(datum)
+    return aggregated
+
+
+def _chunk_metric_data(metric_data: List[dict]) -> Iterator[List[dict]]:
+    chunk: List[dict] = []
+    size = 0
+    for datum in metric_data:
+        datum_size = len(json.dumps(datum, default=str))
+        if chunk and (len(chunk) >= CW_MAX_DATUMS_PER_CALL or size + datum_size > CW_MAX_PAYLOAD_BYTES):
+            yield chunk
+            chunk = []
+            size = 0
+        chunk.append(datum)
+        size += datum_size
+    if chunk:
+        yield chunk
+
+
+@lru_cache(maxsize=64)
+def _rank_plan(n: int, percentiles: tuple) -> Tuple[Tuple[str, int, int, float], ...]:
+    plan = []
+    for p in percentiles:
+        rank = (p / 100) * (n - 1)
+        low = floor(rank)
+        high = min(low + 1, n - 1)
+        plan.append((f"p{p}", low, high, rank - low if low != high else 0.0))
+    return tuple(plan)
 
 
 class RollingPercentiles:
     def __init__(self, max_samples: int = 200) -> None:
-        self.values: Deque[float] = deque(maxlen=max_samples)
+        self.max_samples = max_samples
+        self._ring = array("d", bytes(8 * max_samples))
+        self._next = 0
+        self._size = 0
+        self._sorted: List[float] = []
+        self._cached: Dict[tuple, Dict[str, Optional[float]]] = {}
 
     def add(self, value: float) -> None:
-        self.values.append(value)
+        if self._size == self.max_samples:
+            del self._sorted[bisect_left(self._sorted, self._ring[self._next])]
+        else:
+            self._size += 1
+        self._ring[self._next] = value
+        self._next = (self._next + 1) % self.max_samples
+        insort(self._sorted, value)
+        self._cached.clear()
 
     def percentiles(self, percentiles: Iterable[int]) -> Dict[str, Optional[float]]:
-        data = list(self.values)
+        key = tuple(percentiles)
+        cached = self._cached.get(key)
+        if cached is None:
+            cached = self._cached[key] = self._compute(key)
+        return dict(cached)
+
+    def _compute(self, percentiles: tuple) -> Dict[str, Optional[float]]:
+        data = self._sorted
         if not data:
             return {f"p{p}": None for p in percentiles}
-        data.sort()
-        n = len(data)
-        results: Dict[str, Optional[float]] = {}
-        for p in percentiles:
-            if n == 1:
-                results[f"p{p}"] = data[0]
-                continue
-            rank = (p / 100) * (n - 1)
-            low = floor(rank)
-            high = min(low + 1, n - 1)
-            if low == high:
-                results[f"p{p}"] = data[low]
-            else:
-                frac = rank - low
-                results[f"p{p}"] = data[low] + (data[high] - data[low]) * frac
-        return results
+        return {
+            label: data[low] + (data[high] - data[low]) * frac if frac else data[low]
+            for label, low, high, frac in _rank_plan(len(data), percentiles)
+        }
 
     def count(self) -> int:
-        return len(self.values)
+        return self._size
 
 
 class RollingCacheHitRate:
     def __init__(self, max_samples: int = 200) -> None:
-        self.values: Deque[int] = deque(maxlen=max_samples)
+        self.max_samples = max_samples
+        self._ring = bytearray(max_samples)
+        self._next = 0
+        self._size = 0
+        self._hits = 0
 
     def add(self, hit: bool) -> None:
-        self.values.append(1 if hit else 0)
+        value = 1 if hit else 0
+        self._hits += value - self._ring[self._next]
+        self._ring[self._next] = value
+        self._next = (self._next + 1) % self.max_samples
+        if self._size < self.max_samples:
+            self._size += 1
 
     def rate(self) -> Optional[float]:
-        if not self.values:
+        if not self._size:
             return None
-        return sum(self.values) / len(self.values)
+        return self._hits / self._size
 
     def count(self) -> int:
-        return len(self.values)
+        return self._size
 
 
 class RollingWindowCounter:
     def __init__(self, window_seconds: int = 300) -> None:
         self.window_seconds = window_seconds
-        self.values: Deque[float] = deque()
+        self.values: Deque[tuple[int, int]] = deque()
+        self._total = 0
 
     def add(self, value: int = 1) -> None:
         now = time.time()
-        for _ in range(value):
-            self.values.append(now)
+        second = int(now)
+        if self.values and self.values[-1][0] == second:
+            self.values[-1] = (second, self.values[-1][1] + value)
+        else:
+            self.values.append((second, value))
+        self._total += value
         self._prune(now)
 
     def count(self) -> int:
         now = time.time()
         self._prune(now)
-        return len(self.values)
+        return self._total
 
     def _prune(self, now: float) -> None:
         cutoff = now - self.window_seconds
-        while self.values and self.values[0] < cutoff:
-            self.values.popleft()
+        while self.values and self.values[0][0] < cutoff:
+            self._total -= self.values.popleft()[1]
 
 
 class RollingRequestWindow:
     def __init__(self, window_seconds: int = 300) -> None:
         self.window_seconds = window_seconds
         self.values: Deque[tuple[float, int]] = deque()
+        self._errors = 0
 
     def add(self, status_code: int) -> None:
         now = time.time()
         is_error = 1 if status_code >= 400 else 0
         self.values.append((now, is_error))
+        self._errors += is_error
         self._prune(now)
 
     def error_rate(self) -> Optional[float]:
@@ -545,19 +711,19 @@ class RollingRequestWindow:
         self._prune(now)
         if not self.values:
             return None
-        total = len(self.values)
-        errors = sum(value for _, value in self.values)
-        return errors / total if total else None
+        return self._errors / len(self.values)
 
     def _prune(self, now: float) -> None:
         cutoff = now - self.window_seconds
         while self.values and self.values[0][0] < cutoff:
-            self.values.popleft()
+            self._errors -= self.values.popleft()[1]
 
 
 def log_event(event: str, payload: Dict[str, object]) -> None:
-    record = {"event": event, "timestamp_ms": int(time.time() * 1000), **payload}
-    LOGGER.info(json.dumps(record, default=str))
+    if not LOGGER.isEnabledFor(logging.INFO):
+        return
+    record = {"event": event, "timestamp_ms": time.time_ns() // 1_000_000, **payload}
+    LOGGER.info(orjson.dumps(record, default=str, option=orjson.OPT_NON_STR_KEYS).decode())
 
 
 def configure_tracing(app=None) -> None:
@@ -583,9 +749,9 @@ def configure_tracing(app=None) -> None:
     _TRACE_CONFIGURED = True
 
 
-def start_timer() -> float:
-    return time.perf_counter()
+def start_timer() -> int:
+    return time.perf_counter_ns()
 
 
-def stop_timer(start: float) -> float:
-    return (time.perf_counter() - start) * 1000.0
+def stop_timer(start: int) -> float:
+    return (time.perf_counter_ns() - start) / 1_000_000.0
@@ -2,9 +2,13 @@ from __future__ import annotations
 
 import hashlib
 import re
+import threading
+from bisect import bisect_right
+from collections import OrderedDict
 from dataclasses import dataclass, field
+from itertools import accumulate
 from datetime import datetime, timezone
-from typing import Iterable, List, Optional
+from typing import Dict, List, Optional, Sequence, Set
 from uuid import uuid4
 
 from .schemas import EvidenceMapEntry, IncidentFrame, TimeWindow
@@ -15,21 +19,36 @@ class ParserAdapter:
         raise NotImplementedError
 
 
-@dataclass
-class NormalizedLine:
-    number: int
-    text: str
-    lowered: str
-
-
-@dataclass
+@dataclass(slots=True)
 class NormalizedLog:
-    raw_text: str
-    lines: List[NormalizedLine]
+    texts: List[str]
+    lowered: List[str]
     timestamps: List[str] = field(default_factory=list)
+    lowered_full: str = ""
+    token_line_hits: Dict[str, List[int]] = field(default_factory=dict)
+    truncated: bool = False
+
+    def count(self, token: str) -> int:
+        return len(self.token_line_hits.get(token, ()))
+
+    def lines_with_any(self, *tokens: str) -> Set[int]:
+        found: Set[int] = set()
+        for token in tokens:
+            found.update(self.token_line_hits.get(token, ()))
+        return found
 
+    def first_line_with_any(self, *tokens: str) -> Optional[int]:
+        firsts = [self.token_line_hits[token][0] for token in tokens if token in self.token_line_hits]
+        return min(firsts) if firsts else None
 
-@dataclass
+    def lines_with_all(self, *tokens: str) -> Set[int]:
+        found = set(self.token_line_hits.get(tokens[0], ()))
+        for token in tokens[1:]:
+            found.intersection_update(self.token_line_hits.get(token, ()))
+        return found
+
+
+@dataclass(slots=True)
 class ParserResult:
     primary_error_signature: Optional[str] = None
     secondary_signatures: List[str] = field(default_factory=list)
@@ -42,6 +61,7 @@ class ParserResult:
 
 class BaseLogFamilyParser:
     family: str = "generic"
+    max_score: Optional[int] = None
 
     def match_score(self, normalized: NormalizedLog) -> int:
         raise NotImplementedError
@@ -54,37 +74,28 @@ class TerraformParser(BaseLogFamilyParser):
     family = "terraform"
 
     def match_score(self, normalized: NormalizedLog) -> int:
-        score = 0
-        for line in normalized.lines:
-            if "terraform" in line.lowered:
-                score += 2
-            if "error:" in line.lowered:
-                score += 1
-            if ".tf" in line.lowered and "line" in line.lowered:
-                score += 2
-            if "module." in line.lowered:
-                score += 1
-        return score
+        return (
+            2 * normalized.count("terraform")
+            + normalized.count("error:")
+            + 2 * len(normalized.lines_with_all(".tf", "line"))
+            + normalized.count("module.")
+        )
 
     def extract(self, normalized: NormalizedLog) -> ParserResult:
         result = ParserResult()
-        for line in normalized.lines:
-            if line.lowered.startswith("error:"):
-                result.primary_error_signature = line.text.strip()[:256]
-                result.evidence_map.append(_make_evidence("raw-input", line.number, line.number, line.text))
+        texts = normalized.texts
+        error_lines = normalized.token_line_hits.get("error:", ())
+        for number in error_lines:
+            if normalized.lowered[number - 1].startswith("error:"):
+                _set_primary(result, number, texts[number - 1])
                 break
-        if result.primary_error_signature is None:
-            for line in normalized.lines:
-                if "error:" in line.lowered:
-                    result.primary_error_signature = line.text.strip()[:256]
-                    result.evidence_map.append(_make_evidence("raw-input", line.number, line.number, line.text))
-                    break
-        for line in normalized.lines:
+        if result.primary_error_signature is None and error_lines:
+            _set_primary(result, error_lines[0], texts[error_lines[0] - 1])
+        for number in sorted(normalized.lines_with_all(".tf", "line")):
             if len(result.secondary_signatures) >= 3:
                 break
-            if "on" in line.lowered and ".tf" in line.lowered and "line" in line.lowered:
-                result.secondary_signatures.append(line.text.strip()[:256])
-                result.evidence_map.append(_make_evidence("raw-input", line.number, line.number, line.text))
+            if "on" in normalized.lowered[number - 1]:
+                _add_secondary(result, number, texts[number - 1])
         result.infra_components = ["terraform"]
         return result
 
@@ -93,25 +104,18 @@ class CloudWatchParser(BaseLogFamilyParser):
     family = "cloudwatch"
 
     def match_score(self, normalized: NormalizedLog) -> int:
-        score = 0
-        for line in normalized.lines:
-            if "cloudwatch" in line.lowered:
-                score += 2
-            if "log group" in line.lowered or "log stream" in line.lowered:
-                score += 2
-            if "eventid" in line.lowered or "event id" in line.lowered:
-                score += 1
-            if "awslogs" in line.lowered:
-                score += 1
-        return score
+        return (
+            2 * normalized.count("cloudwatch")
+            + 2 * len(normalized.lines_with_any("log group", "log stream"))
+            + len(normalized.lines_with_any("eventid", "event id"))
+            + normalized.count("awslogs")
+        )
 
     def extract(self, normalized: NormalizedLog) -> ParserResult:
         result = ParserResult()
-        for line in normalized.lines:
-            if _looks_like_error(line.lowered):
-                result.primary_error_signature = line.text.strip()[:256]
-                result.evidence_map.append(_make_evidence("raw-input", line.number, line.number, line.text))
-                break
+        number = normalized.first_line_with_any(*_ERROR_TOKENS)
+        if number is not None:
+            _set_primary(result, number, normalized.texts[number - 1])
         result.infra_components = ["cloudwatch"]
         return result
 
@@ -120,75 +124,87 @@ class PythonTracebackParser(BaseLogFamilyParser):
     family = "python-traceback"
 
     def match_score(self, normalized: NormalizedLog) -> int:
-        score = 0
-        for line in normalized.lines:
-            if "traceback (most recent call last):" in line.lowered:
-                score += 4
-            if line.lowered.strip().startswith("file \"") and ", line" in line.lowered:
-                score += 1
-            if "exception" in line.lowered or "error" in line.lowered:
-                score += 1
-        return score
+        return (
+            4 * normalized.count(_TRACEBACK_HEADER)
+            + normalized.count(_TRACEBACK_FRAME)
+            + len(normalized.lines_with_any("exception", "error"))
+        )
 
     def extract(self, normalized: NormalizedLog) -> ParserResult:
         result = ParserResult()
-        traceback_lines = []
-        for line in normalized.lines:
-            if "traceback (most recent call last):" in line.lowered:
-                traceback_lines.append(line)
-            elif traceback_lines:
-                traceback_lines.append(line)
-                if line.text.strip() and not line.text.startswith(" "):
-                    if len(traceback_lines) > 6:
-                        break
+        texts = normalized.texts
+        traceback_lines: List[int] = []
+        headers = normalized.token_line_hits.get(_TRACEBACK_HEADER, ())
+        first_header = headers[0] if headers else len(texts) + 1
+        for number in range(first_header, len(texts) + 1):
+            traceback_lines.append(number)
+            if number == first_header or _TRACEBACK_HEADER in normalized.lowered[number - 1]:
+                continue
+            text = texts[number - 1]
+            if text and not text.isspace() and not text.startswith(" "):
+                if len(traceback_lines) > 6:
+                    break
         if traceback_lines:
-            last_line = traceback_lines[-1]
-            result.primary_error_signature = last_line.text.strip()[:256]
-            result.evidence_map.append(_make_evidence("raw-input", last_line.number, last_line.number, last_line.text))
-            for line in traceback_lines[:3]:
+            last_number = traceback_lines[-1]
+            _set_primary(result, last_number, texts[last_number - 1])
+            for number in traceback_lines[:3]:
                 if len(result.secondary_signatures) >= 3:
                     break
-                if "file \"" in line.lowered:
-                    result.secondary_signatures.append(line.text.strip()[:256])
-                    result.evidence_map.append(_make_evidence("raw-input", line.number, line.number, line.text))
+                if "file \"" in normalized.lowered[number - 1]:
+                    _add_secondary(result, number, texts[number - 1])
         return result
 
 
 class GenericParser(BaseLogFamilyParser):
     family = "generic"
+    max_score = 1
 
     def match_score(self, normalized: NormalizedLog) -> int:
-        for line in normalized.lines:
-            if _looks_like_error(line.lowered):
-                return 1
-        return 0
+        return 1 if any(normalized.token_line_hits.get(token) for token in _ERROR_TOKENS) else 0
 
     def extract(self, normalized: NormalizedLog) -> ParserResult:
         result = ParserResult()
-        for line in normalized.lines:
-            if _looks_like_error(line.lowered):
-                result.primary_error_signature = line.text.strip()[:256]
-                result.evidence_map.append(_make_evidence("raw-input", line.number, line.number, line.text))
-                break
-        if result.primary_error_signature is None and normalized.lines:
-            first_line = normalized.lines[0]
-            result.primary_error_signature = first_line.text.strip()[:256]
-            result.evidence_map.append(_make_evidence("raw-input", first_line.number, first_line.number, first_line.text))
+        number = normalized.first_line_with_any(*_ERROR_TOKENS)
+        if number is not None:
+            _set_primary(result, number, normalized.texts[number - 1])
+        if result.primary_error_signature is None and normalized.texts:
+            _set_primary(result, 1, normalized.texts[0])
         return result
 
 
 class RuleBasedLogParser(ParserAdapter):
     parser_version = "v0.2"
 
-    def __init__(self) -> None:
-        self.parsers: List[BaseLogFamilyParser] = [
-            TerraformParser(),
-            CloudWatchParser(),
-            PythonTracebackParser(),
-            GenericParser(),
-        ]
+    def __init__(self, cache_size: int = 256) -> None:
+        self.parsers: Sequence[BaseLogFamilyParser] = _PARSERS
+        self.cache_size = cache_size
+        self._cache: OrderedDict[bytes, IncidentFrame] = OrderedDict()
+        self._cache_lock = threading.Lock()
 
     def parse(self, raw_text: str, request_id: str, conversation_id: Optional[str] = None) -> IncidentFrame:
+        key = hashlib.blake2b(raw_text.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+        with self._cache_lock:
+            template = self._cache.get(key)
+            if template is not None:
+                self._cache.move_to_end(key)
+        if template is None:
+            template = self._build_frame(raw_text)
+            if self.cache_size > 0:
+                with self._cache_lock:
+                    self._cache[key] = template
+                    while len(self._cache) > self.cache_size:
+                        self._cache.popitem(last=False)
+        return template.model_copy(
+            update={
+                "frame_id": str(uuid4()),
+                "conversation_id": conversation_id,
+                "request_id": request_id,
+                "created_at": datetime.now(timezone.utc),
+            },
+            deep=True,
+        )
+
+    def _build_frame(self, raw_text: str) -> IncidentFrame:
         normalized = _normalize(raw_text)
         best_parser, best_score = _select_parser(self.parsers, normalized)
         result = best_parser.extract(normalized)
@@ -199,16 +215,19 @@ class RuleBasedLogParser(ParserAdapter):
                 end=normalized.timestamps[-1],
             )
 
-        result.services = _extract_services(raw_text)
-        result.infra_components = list({*result.infra_components, *_extract_infra_components(raw_text)})
-        result.suspected_failure_domain = _guess_domain(raw_text)
+        result.services = _extract_services(normalized.lowered_full)
+        result.infra_components = list(
+            dict.fromkeys(result.infra_components + _extract_infra_components(normalized.lowered_full))
+        )
+        result.suspected_failure_domain = _guess_domain(normalized.lowered_full)
 
         parse_confidence = _score_to_confidence(best_score, result.primary_error_signature)
+        if normalized.truncated:
+            parse_confidence = round(parse_confidence - 0.05, 2)
 
         return IncidentFrame(
-            frame_id=str(uuid4()),
-            conversation_id=conversation_id,
-            request_id=request_id,
+            frame_id="",
+            request_id="",
             source="user_input",
             parser_version=self.parser_version,
             parse_confidence=parse_confidence,
@@ -223,31 +242,125 @@ class RuleBasedLogParser(ParserAdapter):
         )
 
 
+_PARSERS: tuple[BaseLogFamilyParser, ...] = (
+    TerraformParser(),
+    CloudWatchParser(),
+    PythonTracebackParser(),
+    GenericParser(),
+)
+_TRACEBACK_HEADER = "traceback (most recent call last):"
+_TRACEBACK_FRAME = "<traceback-frame>"
+_ERROR_TOKENS = ("error", "exception", "traceback", "fatal", "panic", "failed")
+_LINE_TOKENS = tuple(
+    dict.fromkeys(
+        (
+            "terraform",
+            "error:",
+            ".tf",
+            "line",
+            "module.",
+            "cloudwatch",
+            "log group",
+            "log stream",
+            "eventid",
+            "event id",
+            "awslogs",
+            _TRACEBACK_HEADER,
+            'file "',
+            *_ERROR_TOKENS,
+        )
+    )
+)
+_SERVICE_TOKENS = ("api", "worker", "gateway", "frontend", "backend")
+_INFRA_TOKENS = ("ecs", "alb", "lambda", "dynamodb", "s3", "rds", "redis", "cloudwatch")
+_MAX_SCAN_LINES = 5000
+_HEAD_SCAN_LINES = 500
+_TAIL_SCAN_LINES = 2000
+_sha256 = hashlib.sha256
+_TS_RE = re.compile(r"\d{4}-\d{2}-\d{2}[T\s]\d{2}:\d{2}:\d{2}(?:\.\d+)?Z?", re.ASCII)
+
+
 def _normalize(raw_text: str) -> NormalizedLog:
-    lines: List[NormalizedLine] = []
-    timestamps: List[str] = []
-    for idx, line in enumerate(raw_text.splitlines(), start=1):
-        lowered = line.lower()
-        lines.append(NormalizedLine(number=idx, text=line, lowered=lowered))
-        ts = _extract_timestamp(line)
-        if ts:
-            timestamps.append(ts)
-    return NormalizedLog(raw_text=raw_text, lines=lines, timestamps=timestamps)
+    lowered_full = raw_text.lower()
+    raw_lines = raw_text.splitlines()
+    # Only U+0130 changes length when lowercased; otherwise line boundaries line up.
+    if len(lowered_full) == len(raw_text):
+        lowered_lines = lowered_full.splitlines()
+    else:
+        lowered_lines = [line.lower() for line in raw_lines]
+    line_ends = list(accumulate(map(len, lowered_full.splitlines(keepends=True))))
+    # Very large pastes only scan a head and tail window; line numbers stay absolute.
+    truncated = len(raw_lines) > _MAX_SCAN_LINES
+    if truncated:
+        gap = (line_ends[_HEAD_SCAN_LINES - 1], line_ends[-_TAIL_SCAN_LINES - 1])
+        timestamps = _scan_timestamps(raw_lines[:_HEAD_SCAN_LINES] + raw_lines[-_TAIL_SCAN_LINES:])
+    else:
+        gap = None
+        timestamps = _scan_timestamps(raw_lines)
+    hits = _scan_tokens(lowered_full, line_ends, gap)
+    hits[_TRACEBACK_FRAME] = [
+        number for number in hits.get('file "', ()) if _is_traceback_frame(lowered_lines[number - 1])
+    ]
+    return NormalizedLog(
+        texts=raw_lines,
+        lowered=lowered_lines,
+        timestamps=timestamps,
+        lowered_full=lowered_full,
+        token_line_hits=hits,
+        truncated=truncated,
+    )
+
+
+def _scan_tokens(
+    lowered_full: str,
+    line_ends: List[int],
+    gap: Optional[tuple[int, int]] = None,
+) -> Dict[str, List[int]]:
+    hits: Dict[str, List[int]] = {}
+    for token in _LINE_TOKENS:
+        token_lines: List[int] = []
+        start = lowered_full.find(token)
+        while start != -1:
+            if gap is not None and gap[0] <= start < gap[1]:
+                start = lowered_full.find(token, gap[1])
+                continue
+            number = bisect_right(line_ends, start) + 1
+            token_lines.append(number)
+            start = lowered_full.find(token, line_ends[number - 1])
+        if token_lines:
+            hits[token] = token_lines
+    return hits
+
+
+def _is_traceback_frame(lowered: str) -> bool:
+    # Same as lstrip().startswith('file "') without copying the line.
+    indent = lowered.find('file "')
+    return (indent == 0 or (indent > 0 and lowered[:indent].isspace())) and ", line" in lowered
+
+
+def _scan_timestamps(raw_lines: List[str]) -> List[str]:
+    search = _TS_RE.search
+    return [
+        match.group(0)
+        for line in raw_lines
+        if "-" in line and ":" in line and (match := search(line)) is not None
+    ]
 
 
 def _select_parser(
-    parsers: Iterable[BaseLogFamilyParser],
+    parsers: Sequence[BaseLogFamilyParser],
     normalized: NormalizedLog,
 ) -> tuple[BaseLogFamilyParser, int]:
-    best_parser: Optional[BaseLogFamilyParser] = None
+    # Every family parser scores >= 0, so the first one always replaces this seed.
+    best_parser = parsers[0]
     best_score = -1
     for parser in parsers:
+        if parser.max_score is not None and parser.max_score <= best_score:
+            continue
         score = parser.match_score(normalized)
         if score > best_score:
             best_parser = parser
             best_score = score
-    if best_parser is None:
-        return GenericParser(), 0
     return best_parser, best_score
 
 
@@ -261,51 +374,44 @@ def _score_to_confidence(score: int, has_primary: Optional[str]) -> float:
     return 0.5
 
 
-def _looks_like_error(lowered: str) -> bool:
-    return any(token in lowered for token in ["error", "exception", "traceback", "fatal", "panic", "failed"])
+def _trim_sig(text: str, limit: int = 256) -> str:
+    if len(text) > limit or text[:1].isspace() or text[-1:].isspace():
+        return text.strip()[:limit]
+    return text
 
 
-def _extract_timestamp(line: str) -> Optional[str]:
-    match = re.search(r"\d{4}-\d{2}-\d{2}[T\s]\d{2}:\d{2}:\d{2}(?:\.\d+)?Z?", line)
-    if match:
-        return match.group(0)
-    return None
+def _set_primary(result: ParserResult, number: int, text: str) -> None:
+    result.primary_error_signature = _trim_sig(text)
+    result.evidence_map.append(_make_evidence("raw-input", number, number, text))
+
+
+def _add_secondary(result: ParserResult, number: int, text: str) -> None:
+    result.secondary_signatures.append(_trim_sig(text))
+    result.evidence_map.append(_make_evidence("raw-input", number, number, text))
 
 
 def _make_evidence(source_id: str, line_start: int, line_end: int, text: str) -> EvidenceMapEntry:
-    digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
-    return EvidenceMapEntry(
+    digest = _sha256(text.encode("utf-8")).digest().hex()
+    # Fields are built here with the right types, so skip pydantic validation.
+    return EvidenceMapEntry.model_construct(
         source_type="log",
         source_id=source_id,
         line_start=line_start,
         line_end=line_end,
         excerpt_hash=digest,
-        excerpt=text.strip()[:300],
+        excerpt=_trim_sig(text, 300),
     )
 
 
-def _extract_services(raw_text: str) -> List[str]:
-    candidates = ["api", "worker", "gateway", "frontend", "backend"]
-    found = []
-    lowered = raw_text.lower()
-    for name in candidates:
-        if name in lowered:
-            found.append(name)
-    return found
+def _extract_services(lowered: str) -> List[str]:
+    return [name for name in _SERVICE_TOKENS if name in lowered]
 
 
-def _extract_infra_components(raw_text: str) -> List[str]:
-    candidates = ["ecs", "alb", "lambda", "dynamodb", "s3", "rds", "redis", "cloudwatch"]
-    found = []
-    lowered = raw_text.lower()
-    for name in candidates:
-        if name in lowered:
-            found.append(name)
-    return found
+def _extract_infra_components(lowered: str) -> List[str]:
+    return [name for name in _INFRA_TOKENS if name in lowered]
 
 
-def _guess_domain(raw_text: str) -> Optional[str]:
-    lowered = raw_text.lower()
+def _guess_domain(lowered: str) -> Optional[str]:
     if "timeout" in lowered or "latency" in lowered:
         return "performance"
     if "permission" in lowered or "access denied" in lowered:
@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 from datetime import datetime
-from typing import List, Optional
+from typing import Dict, List, Optional, TypedDict
 from pydantic import BaseModel, Field
 
 
@@ -81,6 +81,29 @@ class ChatHypothesis(BaseModel):
     explanation: str
 
 
+class GuardrailMetadata(TypedDict, total=False):
+    citation_missing_count: int
+    redactions: int
+    domain_restricted: int
+    issues: List[str]
+
+
+class ResponseMetadata(TypedDict, total=False):
+    parser_version: str
+    parse_confidence: float
+    prompt_version: Optional[str]
+    prompt_filename: str
+    model_id: str
+    token_usage: Dict[str, int]
+    guardrails: GuardrailMetadata
+    category: Optional[str]
+    cache_hit: bool
+    cache_similarity: float
+    guardrail_hits_session: int
+    client_redaction_hits: int
+    backend_redaction_hits: int
+
+
 class CanonicalResponse(BaseModel):
     request_id: str
     timestamp: datetime
@@ -1,17 +1,58 @@
 from __future__ import annotations
 
+import hashlib
 import os
+import threading
 import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar
 from decimal import Decimal
 from datetime import datetime
-from typing import Any, Dict, List, Optional
+from functools import lru_cache
+from itertools import islice
+from typing import Any, Dict, Iterator, List, Optional
 from uuid import uuid4
 
 import boto3
-from boto3.dynamodb.conditions import Key
+import orjson
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+from botocore.config import Config
+
+from pydantic import BaseModel
 
 from .schemas import CanonicalResponse, IncidentFrame
 
+# Values DynamoDB accepts as-is; everything else is converted or walked.
+_DYNAMODB_PASSTHROUGH = (str, int, type(None))
+_BATCH_WRITE_MAX_ITEMS = 25
+_BATCH_WRITE_MAX_ATTEMPTS = 5
+_INPUT_DEDUP_CACHE_SIZE = 4096
+_INPUT_DEDUP_TTL_SECONDS = 300
+_EMPTY_ITEM: Dict[str, Any] = {}
+_SERIALIZER = TypeSerializer()
+_DESERIALIZER = TypeDeserializer()
+_LLM_CONTEXT_PROMPT_HEADER = (
+    "You are an expert troubleshooting assistant. Use the conversation context to decide the next action. "
+    "Ask one question at a time or request a single tool command if needed. When enough context exists, "
+    "return the most likely explanations and fix steps. Ground your response in provided evidence.\n"
+)
+DDB_CLIENT_CONFIG = Config(
+    max_pool_connections=int(os.getenv("DDB_MAX_POOL_CONNECTIONS", "50")),
+    retries={"max_attempts": 5, "mode": "adaptive"},
+    tcp_keepalive=True,
+    connect_timeout=1,
+    read_timeout=3,
+)
+_pending_writes: ContextVar[Optional[List[tuple[str, Dict[str, Any]]]]] = ContextVar(
+    "pending_dynamodb_writes", default=None
+)
+# model_dump() results shared by every write in one batch, keyed by id(model).
+_model_dumps: ContextVar[Optional[Dict[int, tuple[BaseModel, Dict[str, Any]]]]] = ContextVar(
+    "model_dumps", default=None
+)
+
 
 class StorageAdapter:
     def save_input(self, conversation_id: Optional[str], request_id: str, raw_text: str) -> str:
@@ -46,29 +87,42 @@ class StorageAdapter:
     def get_conversation_context(self, conversation_id: str, limit: int = 5) -> Dict[str, object]:
         raise NotImplementedError
 
+    @contextmanager
+    def batch_writes(self) -> Iterator[None]:
+        with _reuse_model_dumps():
+            yield
+
 
 class InMemoryStorage(StorageAdapter):
     def __init__(self) -> None:
-        self.inputs: Dict[str, Dict[str, str]] = {}
-        self.frames: Dict[str, IncidentFrame] = {}
-        self.responses: Dict[str, CanonicalResponse] = {}
-        self.events: Dict[str, List[Dict[str, object]]] = {}
-        self.state: Dict[str, Dict[str, object]] = {}
+        # Bounded so a long-running local process doesn't grow without limit; oldest entries go first.
+        self.max_items = int(os.getenv("IN_MEMORY_MAX_ITEMS", "10000"))
+        self.max_events_per_conversation = int(os.getenv("IN_MEMORY_MAX_EVENTS", "1000"))
+        self.inputs: OrderedDict[str, Dict[str, str]] = OrderedDict()
+        self.frames: OrderedDict[str, IncidentFrame] = OrderedDict()
+        self.responses: OrderedDict[str, CanonicalResponse] = OrderedDict()
+        self.events: OrderedDict[str, deque[Dict[str, object]]] = OrderedDict()
+        self.state: OrderedDict[str, Dict[str, object]] = OrderedDict()
+        self._lock = threading.Lock()
 
     def save_input(self, conversation_id: Optional[str], request_id: str, raw_text: str) -> str:
         input_id = str(uuid4())
-        self.inputs[input_id] = {
-            "conversation_id": conversation_id or "",
-            "request_id": request_id,
-            "raw_text": raw_text,
-        }
+        self._store(
+            self.inputs,
+            input_id,
+            {
+                "conversation_id": conversation_id or "",
+                "request_id": request_id,
+                "raw_text": raw_text,
+            },
+        )
         return input_id
 
     def save_frame(self, frame: IncidentFrame) -> None:
-        self.frames[frame.frame_id] = frame
+        self._store(self.frames, frame.frame_id, frame)
 
     def save_response(self, response: CanonicalResponse) -> None:
-        self.responses[response.request_id] = response
+        self._store(self.responses, response.request_id, response)
 
     def save_event(
         self,
@@ -79,18 +133,25 @@ class InMemoryStorage(StorageAdapter):
         response: CanonicalResponse,
         input_id: str,
     ) -> Optional[str]:
-        event_id = f"{int(time.time())}#{request_id}"
+        now = int(time.time())
+        event_id = f"{now}#{request_id}"
         event = {
             "event_id": event_id,
             "conversation_id": conversation_id,
             "request_id": request_id,
             "input_id": input_id,
             "raw_text": raw_text,
+            # Fresh dumps: the batch memo would make stored event and state dicts alias each other.
             "incident_frame": frame.model_dump(),
             "canonical_response": response.model_dump(),
-            "created_at": int(time.time()),
+            "created_at": now,
         }
-        self.events.setdefault(conversation_id, []).append(event)
+        with self._lock:
+            events = self.events.get(conversation_id)
+            if events is None:
+                events = deque(maxlen=self.max_events_per_conversation)
+            events.append(event)
+            self._store_locked(self.events, conversation_id, events)
         return event_id
 
     def update_conversation_state(
@@ -100,22 +161,38 @@ class InMemoryStorage(StorageAdapter):
         frame: IncidentFrame,
         response: CanonicalResponse,
     ) -> None:
-        self.state[conversation_id] = {
-            "conversation_id": conversation_id,
-            "latest_request_id": request_id,
-            "latest_incident_frame": frame.model_dump(),
-            "latest_response_summary": _build_response_summary(response),
-            "updated_at": int(time.time()),
-        }
+        self._store(
+            self.state,
+            conversation_id,
+            {
+                "conversation_id": conversation_id,
+                "latest_request_id": request_id,
+                "latest_incident_frame": frame.model_dump(),
+                "latest_response_summary": _build_response_summary(response),
+                "updated_at": int(time.time()),
+            },
+        )
 
     def get_conversation_context(self, conversation_id: str, limit: int = 5) -> Dict[str, object]:
-        events = self.events.get(conversation_id, [])
+        with self._lock:
+            events = self.events.get(conversation_id) or ()
+            recent_events = list(islice(events, max(len(events) - limit, 0), None))
         return {
             "conversation_id": conversation_id,
             "state": self.state.get(conversation_id),
-            "recent_events": events[-limit:],
+            "recent_events": recent_events,
         }
 
+    def _store(self, store: OrderedDict, key: str, value: Any) -> None:
+        with self._lock:
+            self._store_locked(store, key, value)
+
+    def _store_locked(self, store: OrderedDict, key: str, value: Any) -> None:
+        store[key] = value
+        store.move_to_end(key)
+        while len(store) > self.max_items:
+            store.popitem(last=False)
+
 
 class DynamoDBStorage(StorageAdapter):
     def __init__(self) -> None:
@@ -125,71 +202,82 @@ class DynamoDBStorage(StorageAdapter):
         self.state_table = os.getenv("CONVERSATION_STATE_TABLE", "troubleshooter-conversation-state")
         self.ttl_seconds = int(os.getenv("INPUT_TTL_SECONDS", "86400"))
         self.conversation_ttl_seconds = int(os.getenv("CONVERSATION_TTL_SECONDS", "604800"))
-        self.client = boto3.resource("dynamodb")
+        # The low-level client is safe to share across worker threads; resources and Tables are not.
+        self.client = _dynamodb_client()
+        self._written_lock = threading.Lock()
+        self._recent_inputs: OrderedDict[tuple[str, str, bytes], tuple[str, float]] = OrderedDict()
 
     def save_input(self, conversation_id: Optional[str], request_id: str, raw_text: str) -> str:
+        # A retried request with the same body reuses the input it already stored.
+        input_key = (
+            conversation_id or "",
+            request_id,
+            hashlib.blake2b(raw_text.encode("utf-8", "surrogatepass"), digest_size=16).digest(),
+        )
+        with self._written_lock:
+            recent = self._recent_inputs.get(input_key)
+            if recent is not None and time.monotonic() - recent[1] < _INPUT_DEDUP_TTL_SECONDS:
+                return recent[0]
         input_id = str(uuid4())
-        expires_at = int(time.time()) + self.ttl_seconds
-        inputs = self.client.Table(self.inputs_table)
-        inputs.put_item(
-            Item=_to_dynamodb(
-                {
-                    "input_id": input_id,
-                    "conversation_id": conversation_id or "",
-                    "request_id": request_id,
-                    "raw_text": raw_text,
-                    "created_at": int(time.time()),
-                    "expires_at": expires_at,
-                }
-            )
+        now = int(time.time())
+        expires_at = now + self.ttl_seconds
+        self._put(
+            self.inputs_table,
+            {
+                "input_id": input_id,
+                "conversation_id": conversation_id or "",
+                "request_id": request_id,
+                "raw_text": raw_text,
+                "created_at": now,
+                "expires_at": expires_at,
+            },
         )
 
         if conversation_id:
-            sessions = self.client.Table(self.session_table)
-            sessions.put_item(
-                Item=_to_dynamodb(
-                    {
-                        "conversation_id": conversation_id,
-                        "last_request_id": request_id,
-                        "last_input_id": input_id,
-                        "updated_at": int(time.time()),
-                        "expires_at": expires_at,
-                    }
-                )
+            self._put(
+                self.session_table,
+                {
+                    "conversation_id": conversation_id,
+                    "last_request_id": request_id,
+                    "last_input_id": input_id,
+                    "updated_at": now,
+                    "expires_at": expires_at,
+                },
             )
+        with self._written_lock:
+            self._recent_inputs[input_key] = (input_id, time.monotonic())
+            self._recent_inputs.move_to_end(input_key)
+            while len(self._recent_inputs) > _INPUT_DEDUP_CACHE_SIZE:
+                self._recent_inputs.popitem(last=False)
         return input_id
 
     def save_frame(self, frame: IncidentFrame) -> None:
-        inputs = self.client.Table(self.inputs_table)
-        inputs.put_item(
-            Item=_to_dynamodb(
-                {
-                    "input_id": frame.frame_id,
-                    "item_type": "incident_frame",
-                    "request_id": frame.request_id,
-                    "conversation_id": frame.conversation_id or "",
-                    "parser_version": frame.parser_version,
-                    "parse_confidence": frame.parse_confidence,
-                    "created_at": int(frame.created_at.timestamp()),
-                    "primary_error_signature": frame.primary_error_signature or "",
-                    "frame": frame.model_dump(),
-                }
-            )
+        self._put(
+            self.inputs_table,
+            {
+                "input_id": frame.frame_id,
+                "item_type": "incident_frame",
+                "request_id": frame.request_id,
+                "conversation_id": frame.conversation_id or "",
+                "parser_version": frame.parser_version,
+                "parse_confidence": frame.parse_confidence,
+                "created_at": int(frame.created_at.timestamp()),
+                "primary_error_signature": frame.primary_error_signature or "",
+                "frame_json": _frame_json(frame),
+            },
         )
 
     def save_response(self, response: CanonicalResponse) -> None:
-        inputs = self.client.Table(self.inputs_table)
-        inputs.put_item(
-            Item=_to_dynamodb(
-                {
-                    "input_id": response.request_id,
-                    "item_type": "canonical_response",
-                    "request_id": response.request_id,
-                    "conversation_id": response.conversation_id or "",
-                    "created_at": int(response.timestamp.timestamp()),
-                    "response": response.model_dump(),
-                }
-            )
+        self._put(
+            self.inputs_table,
+            {
+                "input_id": response.request_id,
+                "item_type": "canonical_response",
+                "request_id": response.request_id,
+                "conversation_id": response.conversation_id or "",
+                "created_at": int(response.timestamp.timestamp()),
+                "response": _dump(response),
+            },
         )
 
     def save_event(
@@ -203,23 +291,22 @@ class DynamoDBStorage(StorageAdapter):
     ) -> Optional[str]:
         if not conversation_id:
             return None
-        events = self.client.Table(self.events_table)
-        expires_at = int(time.time()) + self.conversation_ttl_seconds
-        event_id = f"{int(time.time())}#{request_id}"
-        events.put_item(
-            Item=_to_dynamodb(
-                {
-                    "conversation_id": conversation_id,
-                    "event_id": event_id,
-                    "request_id": request_id,
-                    "input_id": input_id,
-                    "raw_text": raw_text,
-                    "incident_frame": frame.model_dump(),
-                    "canonical_response": response.model_dump(),
-                    "created_at": int(time.time()),
-                    "expires_at": expires_at,
-                }
-            )
+        now = int(time.time())
+        expires_at = now + self.conversation_ttl_seconds
+        event_id = f"{now}#{request_id}"
+        self._put(
+            self.events_table,
+            {
+                "conversation_id": conversation_id,
+                "event_id": event_id,
+                "request_id": request_id,
+                "input_id": input_id,
+                "raw_text": raw_text,
+                "incident_frame_json": _frame_json(frame),
+                "canonical_response": _dump(response),
+                "created_at": now,
+                "expires_at": expires_at,
+            },
         )
         return event_id
 
@@ -232,54 +319,158 @@ class DynamoDBStorage(StorageAdapter):
     ) -> None:
         if not conversation_id:
             return
-        state = self.client.Table(self.state_table)
-        expires_at = int(time.time()) + self.conversation_ttl_seconds
-        state.put_item(
-            Item=_to_dynamodb(
-                {
-                    "conversation_id": conversation_id,
-                    "latest_request_id": request_id,
-                    "latest_incident_frame": frame.model_dump(),
-                    "latest_response_summary": _build_response_summary(response),
-                    "updated_at": int(time.time()),
-                    "expires_at": expires_at,
-                }
-            )
+        now = int(time.time())
+        expires_at = now + self.conversation_ttl_seconds
+        self._put(
+            self.state_table,
+            {
+                "conversation_id": conversation_id,
+                "latest_request_id": request_id,
+                "latest_incident_frame_json": _frame_json(frame),
+                "latest_response_summary": _build_response_summary(response),
+                "updated_at": now,
+                "expires_at": expires_at,
+            },
         )
 
     def get_conversation_context(self, conversation_id: str, limit: int = 5) -> Dict[str, object]:
-        events = self.client.Table(self.events_table)
-        state = self.client.Table(self.state_table)
-
-        state_item = state.get_item(Key={"conversation_id": conversation_id}).get("Item")
-        events_resp = events.query(
-            KeyConditionExpression=Key("conversation_id").eq(conversation_id),
+        key = {"conversation_id": {"S": conversation_id}}
+
+        # The state read runs on the shared pool while this thread queries the events.
+        state_future = _read_executor().submit(self.client.get_item, TableName=self.state_table, Key=key)
+        events_resp = self.client.query(
+            TableName=self.events_table,
+            KeyConditionExpression="conversation_id = :conversation_id",
+            ExpressionAttributeValues={":conversation_id": key["conversation_id"]},
             ScanIndexForward=False,
             Limit=limit,
         )
+        state_item = state_future.result().get("Item")
+        if state_item:
+            state_item = _deserialize_item(state_item)
+            _load_frame_json(state_item, "latest_incident_frame")
+        recent_events = [_deserialize_item(item) for item in reversed(events_resp.get("Items") or [])]
+        for event in recent_events:
+            _load_frame_json(event, "incident_frame")
         return {
             "conversation_id": conversation_id,
             "state": state_item,
-            "recent_events": list(reversed(events_resp.get("Items", []))),
+            "recent_events": recent_events,
         }
 
+    @contextmanager
+    def batch_writes(self) -> Iterator[None]:
+        if _pending_writes.get() is not None:
+            yield
+            return
+        pending: List[tuple[str, Dict[str, Any]]] = []
+        token = _pending_writes.set(pending)
+        try:
+            with _reuse_model_dumps():
+                yield
+        finally:
+            _pending_writes.reset(token)
+            try:
+                self._flush(pending)
+            except Exception:
+                self._forget_written()
+                raise
+
+    def _forget_written(self) -> None:
+        # A failed write may have dropped an item we already marked as stored.
+        with self._written_lock:
+            self._recent_inputs.clear()
+
+    def _put(self, table_name: str, item: Dict[str, Any]) -> None:
+        item = _serialize_item(_to_dynamodb(item))
+        pending = _pending_writes.get()
+        if pending is None:
+            try:
+                self.client.put_item(TableName=table_name, Item=item)
+            except Exception:
+                self._forget_written()
+                raise
+        else:
+            pending.append((table_name, item))
+
+    def _flush(self, pending: List[tuple[str, Dict[str, Any]]]) -> None:
+        for start in range(0, len(pending), _BATCH_WRITE_MAX_ITEMS):
+            request_items: Dict[str, List[Dict[str, Any]]] = {}
+            for table_name, item in pending[start : start + _BATCH_WRITE_MAX_ITEMS]:
+                request_items.setdefault(table_name, []).append({"PutRequest": {"Item": item}})
+            for attempt in range(_BATCH_WRITE_MAX_ATTEMPTS):
+                response = self.client.batch_write_item(RequestItems=request_items)
+                request_items = response.get("UnprocessedItems") or {}
+                if not request_items:
+                    break
+                if attempt + 1 < _BATCH_WRITE_MAX_ATTEMPTS:
+                    time.sleep(0.05 * (2**attempt))
+            if request_items:
+                raise RuntimeError(f"DynamoDB batch write left unprocessed items: {list(request_items)}")
+
+
+@lru_cache(maxsize=1)
+def _dynamodb_client():
+    return boto3.client("dynamodb", config=DDB_CLIENT_CONFIG)
+
+
+@lru_cache(maxsize=1)
+def _read_executor() -> ThreadPoolExecutor:
+    return ThreadPoolExecutor(
+        max_workers=int(os.getenv("DDB_READ_WORKERS", "8")), thread_name_prefix="dynamodb-read"
+    )
 
+
+@lru_cache(maxsize=1)
 def get_storage() -> StorageAdapter:
     if os.getenv("USE_DYNAMODB", "false").lower() == "true":
         return DynamoDBStorage()
     return InMemoryStorage()
 
 
+@contextmanager
+def _reuse_model_dumps() -> Iterator[None]:
+    if _model_dumps.get() is not None:
+        yield
+        return
+    token = _model_dumps.set({})
+    try:
+        yield
+    finally:
+        _model_dumps.reset(token)
+
+
+def _dump(model: BaseModel) -> Dict[str, Any]:
+    dumps = _model_dumps.get()
+    if dumps is None:
+        return model.model_dump()
+    cached = dumps.get(id(model))
+    if cached is None:
+        cached = dumps[id(model)] = (model, model.model_dump())
+    return cached[1]
+
+
+def _frame_json(frame: IncidentFrame) -> str:
+    # Frames are stored as one string attribute instead of a nested map.
+    return orjson.dumps(_dump(frame)).decode()
+
+
+def _load_frame_json(item: Dict[str, Any], key: str) -> None:
+    blob = item.pop(f"{key}_json", None)
+    if blob is not None:
+        item[key] = orjson.loads(blob)
+
+
 def _build_response_summary(response: CanonicalResponse) -> Dict[str, object]:
-    top_hypothesis = response.hypotheses[0] if response.hypotheses else None
+    dumped = _dump(response)
     return {
         "request_id": response.request_id,
         "timestamp": response.timestamp.isoformat(),
-        "top_hypothesis": top_hypothesis.model_dump() if top_hypothesis else None,
+        "top_hypothesis": dumped["hypotheses"][0] if dumped["hypotheses"] else None,
         "assistant_message": response.assistant_message,
         "completion_state": response.completion_state,
         "next_question": response.next_question,
-        "tool_calls": [call.model_dump() for call in response.tool_calls],
+        "tool_calls": dumped["tool_calls"],
         "fix_steps": response.fix_steps,
         "metadata": response.metadata,
         "guardrail_hits_session": response.metadata.get("guardrail_hits_session")
@@ -289,66 +480,91 @@ def _build_response_summary(response: CanonicalResponse) -> Dict[str, object]:
 
 
 def _to_dynamodb(value: Any) -> Any:
+    if isinstance(value, _DYNAMODB_PASSTHROUGH):
+        return value
+    if isinstance(value, dict):
+        return {
+            key: item if isinstance(item, _DYNAMODB_PASSTHROUGH) else _to_dynamodb(item)
+            for key, item in value.items()
+        }
+    if isinstance(value, list):
+        return [item if isinstance(item, _DYNAMODB_PASSTHROUGH) else _to_dynamodb(item) for item in value]
     if isinstance(value, float):
         return Decimal(str(value))
     if isinstance(value, datetime):
         return value.isoformat()
-    if isinstance(value, dict):
-        return {key: _to_dynamodb(item) for key, item in value.items()}
-    if isinstance(value, list):
-        return [_to_dynamodb(item) for item in value]
     return value
 
 
+def _serialize_item(item: Dict[str, Any]) -> Dict[str, Any]:
+    return {key: _SERIALIZER.serialize(value) for key, value in item.items()}
+
+
+def _deserialize_item(item: Dict[str, Any]) -> Dict[str, Any]:
+    return {key: _DESERIALIZER.deserialize(value) for key, value in item.items()}
+
+
+def _prompt_json(value: Any) -> str:
+    return orjson.dumps(value, default=_json_default).decode()
+
+
+def _json_default(value: Any) -> Any:
+    # Items read back from DynamoDB carry numbers as Decimal.
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _compact_event(event: Dict[str, Any]) -> Dict[str, object]:
+    frame = event.get("incident_frame") or _EMPTY_ITEM
+    response = event.get("canonical_response") or _EMPTY_ITEM
+    hypotheses = response.get("hypotheses") or ()
+    return {
+        "request_id": event.get("request_id"),
+        "primary_error_signature": frame.get("primary_error_signature"),
+        "secondary_signatures": frame.get("secondary_signatures", [])[:3],
+        "services": frame.get("services", []),
+        "infra_components": frame.get("infra_components", []),
+        "suspected_failure_domain": frame.get("suspected_failure_domain"),
+        "top_hypothesis": hypotheses[0] if hypotheses else None,
+        "assistant_message": response.get("assistant_message"),
+        "completion_state": response.get("completion_state"),
+        "next_question": response.get("next_question"),
+        "tool_calls": response.get("tool_calls"),
+        "fix_steps": response.get("fix_steps"),
+    }
+
+
 def build_llm_context(storage: StorageAdapter, conversation_id: str, limit: int = 5) -> Dict[str, object]:
     context = storage.get_conversation_context(conversation_id, limit=limit)
     state = context.get("state") or {}
     recent_events = context.get("recent_events") or []
 
-    compact_events = []
+    compact_events = [_compact_event(event) for event in recent_events]
     recent_messages = []
     for event in recent_events:
-        frame = event.get("incident_frame") or {}
-        response = event.get("canonical_response") or {}
-        hypotheses = response.get("hypotheses") or []
-        top_hypothesis = hypotheses[0] if hypotheses else None
         raw_input = (event.get("raw_text") or event.get("raw_input") or "")[:800]
-        compact_events.append(
-            {
-                "request_id": event.get("request_id"),
-                "primary_error_signature": frame.get("primary_error_signature"),
-                "secondary_signatures": frame.get("secondary_signatures", [])[:3],
-                "services": frame.get("services", []),
-                "infra_components": frame.get("infra_components", []),
-                "suspected_failure_domain": frame.get("suspected_failure_domain"),
-                "top_hypothesis": top_hypothesis,
-                "assistant_message": response.get("assistant_message"),
-                "completion_state": response.get("completion_state"),
-                "next_question": response.get("next_question"),
-                "tool_calls": response.get("tool_calls"),
-                "fix_steps": response.get("fix_steps"),
-            }
-        )
         if raw_input:
             recent_messages.append({"request_id": event.get("request_id"), "raw_input": raw_input})
 
     latest_frame = state.get("latest_incident_frame") or {}
     latest_summary = state.get("latest_response_summary") or {}
 
-    prompt = (
-        "You are an expert troubleshooting assistant. Use the conversation context to decide the next action. "
-        "Ask one question at a time or request a single tool command if needed. When enough context exists, "
-        "return the most likely explanations and fix steps. Ground your response in provided evidence.\n\n"
-        f"Conversation ID: {conversation_id}\n"
-        f"Latest error signature: {latest_frame.get('primary_error_signature')}\n"
-        f"Services: {', '.join(latest_frame.get('services', []))}\n"
-        f"Infra components: {', '.join(latest_frame.get('infra_components', []))}\n"
-        f"Suspected failure domain: {latest_frame.get('suspected_failure_domain')}\n"
-        f"Top hypothesis: {latest_summary.get('top_hypothesis')}\n"
-        f"Pending question: {latest_summary.get('next_question')}\n"
-        f"Pending tool calls: {latest_summary.get('tool_calls')}\n"
-        f"Recent events: {compact_events}\n"
-        f"Recent user inputs: {recent_messages}\n"
+    prompt = "\n".join(
+        (
+            _LLM_CONTEXT_PROMPT_HEADER,
+            f"Conversation ID: {conversation_id}",
+            f"Latest error signature: {latest_frame.get('primary_error_signature')}",
+            f"Services: {', '.join(latest_frame.get('services', []))}",
+            f"Infra components: {', '.join(latest_frame.get('infra_components', []))}",
+            f"Suspected failure domain: {latest_frame.get('suspected_failure_domain')}",
+            f"Top hypothesis: {_prompt_json(latest_summary.get('top_hypothesis'))}",
+            f"Pending question: {latest_summary.get('next_question')}",
+            f"Pending tool calls: {_prompt_json(latest_summary.get('tool_calls'))}",
+            f"Recent events: {_prompt_json(compact_events)}",
+            f"Recent user inputs: {_prompt_json(recent_messages)}",
+            "",
+        )
     )
 
     return {
@@ -4,15 +4,8 @@ import re
 from typing import List
 
 
-def normalize_text(value: str) -> str:
-    return " ".join(value.lower().split())
-
-
-def is_non_informative(answer: str) -> bool:
-    if not answer:
-        return True
-    normalized = normalize_text(answer)
-    if normalized in {
+_NON_INFORMATIVE_ANSWERS = frozenset(
+    {
         "no",
         "nope",
         "idk",
@@ -37,7 +30,44 @@ def is_non_informative(answer: str) -> bool:
         "i don't have it",
         "not available",
         "no idea",
-    }:
+    }
+)
+_REQUEST_PAYLOAD_PHRASES = (
+    "request payload",
+    "request body",
+    "request json",
+    "request xml",
+)
+_RESPONSE_PAYLOAD_PHRASES = (
+    "response payload",
+    "response body",
+    "response json",
+    "response xml",
+)
+_ERROR_DETAIL_PHRASES = (
+    "error response",
+    "error message",
+    "exact error",
+    "stack trace",
+    "stacktrace",
+    "trace",
+    "logs",
+    "log",
+)
+_STRUCTURED_CHARS = frozenset("{}<>\n")
+_KEY_VALUE_RE = re.compile(r"\b\w+\s*[:=]\s*[^,\s]+")
+_JSON_PAIR_RE = re.compile(r"\"[^\"]+\"\s*:\s*\"[^\"]+\"")
+
+
+def normalize_text(value: str) -> str:
+    return " ".join(value.lower().split())
+
+
+def is_non_informative(answer: str) -> bool:
+    if not answer:
+        return True
+    normalized = normalize_text(answer)
+    if normalized in _NON_INFORMATIVE_ANSWERS:
         return True
     return False
 
@@ -45,11 +75,11 @@ def is_non_informative(answer: str) -> bool:
 def looks_like_structured_payload(answer: str) -> bool:
     if not answer:
         return False
-    if any(char in answer for char in ("{", "}", "<", ">", "\n")):
+    if not _STRUCTURED_CHARS.isdisjoint(answer):
         return True
-    if re.search(r"\b\w+\s*[:=]\s*[^,\s]+", answer):
+    if _KEY_VALUE_RE.search(answer):
         return True
-    if re.search(r"\"[^\"]+\"\s*:\s*\"[^\"]+\"", answer):
+    if _JSON_PAIR_RE.search(answer):
         return True
     return False
 
@@ -72,40 +102,12 @@ def missing_required_details(question: str, answer: str) -> List[str]:
         return []
     question_norm = normalize_text(question)
     missing: List[str] = []
-    payload_requested = any(
-        phrase in question_norm
-        for phrase in (
-            "request payload",
-            "request body",
-            "request json",
-            "request xml",
-        )
-    )
-    response_payload_requested = any(
-        phrase in question_norm
-        for phrase in (
-            "response payload",
-            "response body",
-            "response json",
-            "response xml",
-        )
-    )
+    payload_requested = any(phrase in question_norm for phrase in _REQUEST_PAYLOAD_PHRASES)
+    response_payload_requested = any(phrase in question_norm for phrase in _RESPONSE_PAYLOAD_PHRASES)
     payload_generic = "payload" in question_norm and not (payload_requested or response_payload_requested)
     if (payload_requested or payload_generic) and not _answer_contains_request_payload(answer):
         missing.append("request payload")
-    error_requested = any(
-        phrase in question_norm
-        for phrase in (
-            "error response",
-            "error message",
-            "exact error",
-            "stack trace",
-            "stacktrace",
-            "trace",
-            "logs",
-            "log",
-        )
-    )
+    error_requested = any(phrase in question_norm for phrase in _ERROR_DETAIL_PHRASES)
     if (error_requested or response_payload_requested) and not _answer_contains_error_response(answer):
         missing.append("error response")
     return missing
@@ -149,12 +151,9 @@ def rephrase_missing_details(missing: List[str]) -> str:
     )
 
 
-def is_allowed_domain(text: str) -> bool:
-    if not text:
-        return True
-    normalized = text.lower()
-    tokens = set(re.findall(r"[a-z0-9+/.-]+", normalized))
-    token_keywords = (
+_TOKEN_RE = re.compile(r"[a-z0-9+/.-]+")
+_DOMAIN_TOKEN_KEYWORDS = frozenset(
+    {
         "terraform",
         "pulumi",
         "cloudformation",
@@ -209,28 +208,36 @@ def is_allowed_domain(text: str) -> bool:
         "kafka",
         "queue",
         "cache",
-    )
-    phrase_keywords = (
-        "stack trace",
-        "traceback",
-        "error",
-        "exception",
-        "failed",
-        "timeout",
-        "infra as code",
-        "infrastructure as code",
-    )
-    if any(keyword in tokens for keyword in token_keywords):
-        return True
-    if any(phrase in normalized for phrase in phrase_keywords):
-        return True
-    if re.search(r"```", text):
+    }
+)
+_DOMAIN_PHRASE_KEYWORDS = (
+    "stack trace",
+    "traceback",
+    "error",
+    "exception",
+    "failed",
+    "timeout",
+    "infra as code",
+    "infrastructure as code",
+)
+_DOMAIN_PATTERN_RE = re.compile(
+    r"```"
+    r"|(?i:\b(?:class|def|function|SELECT|INSERT|UPDATE|FROM)\b)"
+    r"|\b[A-Za-z0-9_/.-]+\.(?:py|js|ts|go|java|rb|tf|yaml|yml|json|sh|ps1)\b"
+    r"|\b(?:4\d{2}|5\d{2})\b"
+)
+
+
+def is_allowed_domain(text: str) -> bool:
+    if not text:
         return True
-    if re.search(r"\b(class|def|function|SELECT|INSERT|UPDATE|FROM)\b", text, flags=re.IGNORECASE):
+    normalized = text.lower()
+    if not _DOMAIN_TOKEN_KEYWORDS.isdisjoint(_TOKEN_RE.findall(normalized)):
         return True
-    if re.search(r"\b[A-Za-z0-9_/.-]+\.(py|js|ts|go|java|rb|tf|yaml|yml|json|sh|ps1)\b", text):
+    if any(phrase in normalized for phrase in _DOMAIN_PHRASE_KEYWORDS):
         return True
-    if re.search(r"\b(4\d{2}|5\d{2})\b", text):
+    # Code fences, code/SQL keywords, source file names, and HTTP 4xx/5xx codes.
+    if _DOMAIN_PATTERN_RE.search(text):
         return True
     return False
 
@@ -1,91 +1,130 @@
+# Utility helpers for guardrails and redaction.
 from __future__ import annotations
 
 import re
+from typing import Callable, Union
 
+_Replacement = Union[str, Callable[[re.Match[str]], str]]
 
-def redact_sensitive_text(text: str) -> tuple[str, int]:
-    redacted = text
-    hits = 0
-
-    def sub(pattern: str, replacement: str, flags: int = 0) -> None:
-        nonlocal redacted, hits
-        redacted, count = re.subn(pattern, replacement, redacted, flags=flags)
-        hits += count
-
-    def luhn_check(value: str) -> bool:
-        total = 0
-        should_double = False
-        for ch in reversed(value):
-            if not ch.isdigit():
-                return False
-            digit = int(ch)
-            add = digit * 2 if should_double else digit
-            if add > 9:
-                add -= 9
-            total += add
-            should_double = not should_double
-        return total % 10 == 0
-
-    sub(r"-----BEGIN [\s\S]+? PRIVATE KEY-----[\s\S]+?-----END [\s\S]+? PRIVATE KEY-----", "[PRIVATE_KEY]")
-    sub(r"\bAKIA[0-9A-Z]{16}\b", "[AWS_ACCESS_KEY_ID]")
-    sub(r"\bASIA[0-9A-Z]{16}\b", "[AWS_ACCESS_KEY_ID]")
-    sub(r"\b[A-Za-z0-9/+=]{40}\b", "[AWS_SECRET_ACCESS_KEY]")
-    sub(r"\barn:aws[a-z-]*:[^\s]+", "[AWS_ARN]", flags=re.IGNORECASE)
-    sub(r"\b\d{12}\b", "[ACCOUNT_ID]")
-    sub(r"\beyJ[A-Za-z0-9_-]+\.[A-Za-z0-9_-]+\.[A-Za-z0-9_-]+\b", "[JWT]")
-    sub(r"\bghp_[A-Za-z0-9]{36,}\b", "[GITHUB_TOKEN]")
-    sub(r"\bgho_[A-Za-z0-9]{36,}\b", "[GITHUB_TOKEN]")
-    sub(r"\bxox[baprs]-[A-Za-z0-9-]{10,}\b", "[SLACK_TOKEN]")
-    sub(
-        r"\bAuthorization:\s*Bearer\s+[A-Za-z0-9._\-+/=]+\b",
+# Each pattern carries literals at least one of which must be present for it to match, so
+# patterns that cannot fire skip their scan. Case-insensitive literals are checked against
+# a lowered copy of the text that also folds the characters re.IGNORECASE treats as ASCII "i"/"s".
+_REDACTION_PATTERNS: tuple[tuple[re.Pattern[str], _Replacement, tuple[str, ...], bool], ...] = (
+    (
+        re.compile(r"-----BEGIN [\s\S]+? PRIVATE KEY-----[\s\S]+?-----END [\s\S]+? PRIVATE KEY-----"),
+        "[PRIVATE_KEY]",
+        ("-----BEGIN ",),
+        False,
+    ),
+    (re.compile(r"\b(?:AKIA|ASIA)[0-9A-Z]{16}\b"), "[AWS_ACCESS_KEY_ID]", ("AKIA", "ASIA"), False),
+    (re.compile(r"\b[A-Za-z0-9/+=]{40}\b"), "[AWS_SECRET_ACCESS_KEY]", (), False),
+    (re.compile(r"\barn:aws[a-z-]*:[^\s]+", re.IGNORECASE), "[AWS_ARN]", ("arn:aws",), True),
+    (re.compile(r"\b\d{12}\b"), "[ACCOUNT_ID]", (), False),
+    (re.compile(r"\beyJ[A-Za-z0-9_-]+\.[A-Za-z0-9_-]+\.[A-Za-z0-9_-]+\b"), "[JWT]", ("eyJ",), False),
+    (re.compile(r"\bgh[po]_[A-Za-z0-9]{36,}\b"), "[GITHUB_TOKEN]", ("ghp_", "gho_"), False),
+    (re.compile(r"\bxox[baprs]-[A-Za-z0-9-]{10,}\b"), "[SLACK_TOKEN]", ("xox",), False),
+    (
+        re.compile(r"\bAuthorization:\s*Bearer\s+[A-Za-z0-9._\-+/=]+\b", re.IGNORECASE),
         "Authorization: Bearer [BEARER_TOKEN]",
-        flags=re.IGNORECASE,
-    )
-    sub(r"\b[A-Z0-9._%+-]+@[A-Z0-9.-]+\.[A-Z]{2,}\b", "[EMAIL]", flags=re.IGNORECASE)
-    sub(r"\b(?:(?:25[0-5]|2[0-4]\d|1?\d?\d)\.){3}(?:25[0-5]|2[0-4]\d|1?\d?\d)\b", "[IP_ADDRESS]")
-    sub(r"\b(?:[0-9A-F]{2}[:-]){5}[0-9A-F]{2}\b", "[MAC_ADDRESS]", flags=re.IGNORECASE)
-    sub(r"\b[0-9A-F]{4}\.[0-9A-F]{4}\.[0-9A-F]{4}\b", "[MAC_ADDRESS]", flags=re.IGNORECASE)
-    sub(r"\b([0-9a-f]{0,4}:){2,7}[0-9a-f]{0,4}\b", "[IPV6_ADDRESS]", flags=re.IGNORECASE)
-    sub(r"\b\d{3}-\d{2}-\d{4}\b", "[SSN]")
-    sub(r"\b\+?\d{1,3}[\s.-]?\(?\d{2,3}\)?[\s.-]?\d{3}[\s.-]?\d{4}\b", "[PHONE_NUMBER]")
-    sub(
-        r"\b(passport|passport\s*no|passport\s*number)\b[:\s#-]*[A-Z0-9]{6,9}\b",
+        ("bearer",),
+        True,
+    ),
+    (re.compile(r"\b[A-Z0-9._%+-]+@[A-Z0-9.-]+\.[A-Z]{2,}\b", re.IGNORECASE), "[EMAIL]", ("@",), False),
+    (
+        re.compile(r"\b(?:(?:25[0-5]|2[0-4]\d|1?\d?\d)\.){3}(?:25[0-5]|2[0-4]\d|1?\d?\d)\b"),
+        "[IP_ADDRESS]",
+        (".",),
+        False,
+    ),
+    (re.compile(r"\b(?:[0-9A-F]{2}[:-]){5}[0-9A-F]{2}\b", re.IGNORECASE), "[MAC_ADDRESS]", (":", "-"), False),
+    (re.compile(r"\b[0-9A-F]{4}\.[0-9A-F]{4}\.[0-9A-F]{4}\b", re.IGNORECASE), "[MAC_ADDRESS]", (".",), False),
+    (re.compile(r"\b([0-9a-f]{0,4}:){2,7}[0-9a-f]{0,4}\b", re.IGNORECASE), "[IPV6_ADDRESS]", (":",), False),
+    (re.compile(r"\b\d{3}-\d{2}-\d{4}\b"), "[SSN]", ("-",), False),
+    (re.compile(r"\b\+?\d{1,3}[\s.-]?\(?\d{2,3}\)?[\s.-]?\d{3}[\s.-]?\d{4}\b"), "[PHONE_NUMBER]", (), False),
+    (
+        re.compile(r"\b(passport|passport\s*no|passport\s*number)\b[:\s#-]*[A-Z0-9]{6,9}\b", re.IGNORECASE),
         "[PASSPORT_NUMBER]",
-        flags=re.IGNORECASE,
-    )
-    sub(
-        r"\b(driver'?s?\s*licen[cs]e|dl|d/l)\b[:\s#-]*[A-Z0-9-]{4,20}\b",
+        ("passport",),
+        True,
+    ),
+    (
+        re.compile(r"\b(driver'?s?\s*licen[cs]e|dl|d/l)\b[:\s#-]*[A-Z0-9-]{4,20}\b", re.IGNORECASE),
         "[DRIVER_LICENSE]",
-        flags=re.IGNORECASE,
-    )
-    sub(
-        r"\b(ein|tin|vat|abn|bn|gst|business\s*no|company\s*no)\b[:\s#-]*[A-Z0-9-]{5,}\b",
+        ("driver", "dl", "d/l"),
+        True,
+    ),
+    (
+        re.compile(
+            r"\b(ein|tin|vat|abn|bn|gst|business\s*no|company\s*no)\b[:\s#-]*[A-Z0-9-]{5,}\b",
+            re.IGNORECASE,
+        ),
         "[BUSINESS_NUMBER]",
-        flags=re.IGNORECASE,
-    )
-    redacted, count = re.subn(
-        r"\b(user(name)?|login|uid|user_id|account|owner)\b\s*[:=]\s*([^\s,;]+)",
+        ("ein", "tin", "vat", "bn", "gst", "business", "company"),
+        True,
+    ),
+    (
+        re.compile(r"\b(user(name)?|login|uid|user_id|account|owner)\b\s*[:=]\s*([^\s,;]+)", re.IGNORECASE),
         lambda match: f"{match.group(1)}=[USERNAME]",
-        redacted,
-        flags=re.IGNORECASE,
-    )
-    hits += count
-    sub(r"\"(user(name)?|login|uid|user_id|account|owner)\"\s*:\s*\"([^\"]+)\"", "\"\\1\":\"[USERNAME]\"", flags=re.IGNORECASE)
-    redacted, count = re.subn(
-        r"\b(password|passwd|pwd|secret|token|api[_-]?key|apikey|auth|authorization)\b\s*[:=]\s*([^\s,;]+)",
+        ("user", "login", "uid", "account", "owner"),
+        True,
+    ),
+    (
+        re.compile(r"\"(user(name)?|login|uid|user_id|account|owner)\"\s*:\s*\"([^\"]+)\"", re.IGNORECASE),
+        "\"\\1\":\"[USERNAME]\"",
+        ("user", "login", "uid", "account", "owner"),
+        True,
+    ),
+    (
+        re.compile(
+            r"\b(password|passwd|pwd|secret|token|api[_-]?key|apikey|auth|authorization)\b\s*[:=]\s*([^\s,;]+)",
+            re.IGNORECASE,
+        ),
         lambda match: f"{match.group(1)}=[SECRET]",
-        redacted,
-        flags=re.IGNORECASE,
-    )
-    hits += count
+        ("pass", "pwd", "secret", "token", "api", "auth"),
+        True,
+    ),
+)
+_GATE_FOLD = str.maketrans({"\u0130": "i", "\u0131": "i", "\u017f": "s"})
+_CREDIT_CARD_RE = re.compile(r"\b(?:\d[ -]*?){13,19}\b")
+# Luhn doubling with the "subtract 9" step folded in, indexed by digit.
+_LUHN_DOUBLED = (0, 2, 4, 6, 8, 1, 3, 5, 7, 9)
+
+
+def redact_sensitive_text(text: str) -> tuple[str, int]:
+    redacted = text
+    hits = 0
+    folded = None
+    for pattern, replacement, literals, fold in _REDACTION_PATTERNS:
+        if literals:
+            if fold:
+                if folded is None:
+                    folded = redacted.translate(_GATE_FOLD).lower()
+                haystack = folded
+            else:
+                haystack = redacted
+            if not any(literal in haystack for literal in literals):
+                continue
+        redacted, count = pattern.subn(replacement, redacted)
+        if count:
+            hits += count
+            folded = None
 
     def credit_card_replacer(match: re.Match[str]) -> str:
         nonlocal hits
-        digits = re.sub(r"\D", "", match.group(0))
-        if 13 <= len(digits) <= 19 and luhn_check(digits):
+        # The match is only digits, spaces and hyphens.
+        digits = match.group(0).replace(" ", "").replace("-", "")
+        if 13 <= len(digits) <= 19 and _luhn_check(digits):
             hits += 1
             return "[CREDIT_CARD]"
         return match.group(0)
 
-    redacted = re.sub(r"\b(?:\d[ -]*?){13,19}\b", credit_card_replacer, redacted)
+    redacted = _CREDIT_CARD_RE.sub(credit_card_replacer, redacted)
     return redacted, hits
+
+
+def _luhn_check(value: str) -> bool:
+    if not value.isdigit():
+        return False
+    digits = [int(ch) for ch in value]
+    total = sum(digits[-1::-2]) + sum(_LUHN_DOUBLED[digit] for digit in digits[-2::-2])
+    return total % 10 == 0
@@ -0,0 +1,89 @@
+import json
+import unittest
+from datetime import datetime, timezone
+
+import _bootstrap  # noqa: F401
+from app.cache.pgvector import PgVectorCache, _key_hash, sanitize_text
+from app.schemas import CanonicalResponse
+
+
+class _FakeCursor:
+    def __init__(self, rows: dict) -> None:
+        self.rows = rows
+        self.queries: list = []
+        self._row = None
+
+    def __enter__(self) -> "_FakeCursor":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        return None
+
+    def execute(self, sql: str, params: tuple = ()) -> None:
+        kind = "key_hash" if "key_hash = %s" in sql else "vector"
+        self.queries.append((kind, params))
+        self._row = self.rows.get((kind, params[0]))
+
+    def fetchone(self):
+        return self._row
+
+
+class _FakeConnection:
+    def __init__(self, cursor: _FakeCursor) -> None:
+        self._cursor = cursor
+
+    def __enter__(self) -> "_FakeConnection":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        return None
+
+    def cursor(self) -> _FakeCursor:
+        return self._cursor
+
+
+def _payload() -> str:
+    response = CanonicalResponse(
+        request_id="req-1",
+        conversation_id="conv-1",
+        timestamp=datetime.now(timezone.utc),
+        assistant_message="Check the IAM policy.",
+        completion_state="final",
+    )
+    return json.dumps(response.model_dump(mode="json"))
+
+
+class PgVectorLookupTests(unittest.TestCase):
+    def _cache(self, rows: dict) -> tuple:
+        cache = PgVectorCache()
+        cache.enabled = True
+        cursor = _FakeCursor(rows)
+        cache._connect = lambda: _FakeConnection(cursor)
+        embedded: list = []
+        cache._embed = lambda text: embedded.append(text) or [0.0] * 256
+        return cache, cursor, embedded
+
+    def test_exact_repeat_skips_embedding(self) -> None:
+        query = "AccessDenied on s3:GetObject"
+        key = _key_hash(sanitize_text(query))
+        cache, cursor, embedded = self._cache({("key_hash", key): (_payload(), 1.0)})
+
+        hit = cache.lookup(endpoint="explain", query_text=query)
+
+        self.assertIsNotNone(hit)
+        self.assertEqual(hit.similarity, 1.0)
+        self.assertEqual(embedded, [])
+        self.assertEqual([kind for kind, _ in cursor.queries], ["key_hash"])
+
+    def test_non_match_falls_through_to_vector_query(self) -> None:
+        cache, cursor, embedded = self._cache({})
+
+        hit = cache.lookup(endpoint="explain", query_text="Timeout calling payments")
+
+        self.assertIsNone(hit)
+        self.assertEqual(embedded, ["Timeout calling payments"])
+        self.assertEqual([kind for kind, _ in cursor.queries], ["key_hash", "vector"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,12 +1,7 @@
-import os
-import sys
 import unittest
 
-CURRENT_DIR = os.path.dirname(__file__)
-PROJECT_ROOT = os.path.abspath(os.path.join(CURRENT_DIR, ".."))
-sys.path.append(PROJECT_ROOT)
-
-from app.utils.guardrail_utils import is_allowed_domain  # noqa: E402
+import _bootstrap  # noqa: F401
+from app.utils.guardrail_utils import is_allowed_domain
 
 
 class DomainGuardrailTests(unittest.TestCase):
@@ -1,69 +1,65 @@
-import os
-import sys
 import unittest
 
-CURRENT_DIR = os.path.dirname(__file__)
-PROJECT_ROOT = os.path.abspath(os.path.join(CURRENT_DIR, ".."))
-sys.path.append(PROJECT_ROOT)
+import _bootstrap  # noqa: F401
+from app.llm.guardrails import enforce_guardrails
+from app.schemas import EvidenceMapEntry, Hypothesis
 
-from app.llm.guardrails import enforce_guardrails  # noqa: E402
-from app.schemas import EvidenceMapEntry, Hypothesis  # noqa: E402
+
+def _hypothesis(**fields) -> Hypothesis:
+    # Trusted literals: skip validation so the tests only pay for enforce_guardrails.
+    return Hypothesis.model_construct(**{"id": "h1", "rank": 1, "citations": [], **fields})
+
+
+def _evidence(line: int, excerpt_hash: str) -> EvidenceMapEntry:
+    return EvidenceMapEntry.model_construct(
+        source_type="log",
+        source_id="raw-input",
+        line_start=line,
+        line_end=line,
+        excerpt_hash=excerpt_hash,
+    )
+
+
+_ALLOWED_CITATION = _evidence(1, "abc")
+_INVALID_CITATION = _evidence(2, "def")
 
 
 class GuardrailsTests(unittest.TestCase):
     def test_missing_citations_caps_confidence(self) -> None:
-        hypothesis = Hypothesis(
-            id="h1",
-            rank=1,
-            confidence=0.8,
-            explanation="Something failed.",
-            citations=[],
-        )
+        hypothesis = _hypothesis(confidence=0.8, explanation="Something failed.")
         updated, report = enforce_guardrails([hypothesis], allowed_citations=[])
         self.assertEqual(report.citation_missing_count, 1)
         self.assertTrue(updated[0].explanation.startswith("No citation found."))
         self.assertLessEqual(updated[0].confidence, 0.3)
 
     def test_filters_invalid_citations(self) -> None:
-        allowed = EvidenceMapEntry(
-            source_type="log",
-            source_id="raw-input",
-            line_start=1,
-            line_end=1,
-            excerpt_hash="abc",
-        )
-        invalid = EvidenceMapEntry(
-            source_type="log",
-            source_id="raw-input",
-            line_start=2,
-            line_end=2,
-            excerpt_hash="def",
-        )
-        hypothesis = Hypothesis(
-            id="h1",
-            rank=1,
+        hypothesis = _hypothesis(
             confidence=0.6,
             explanation="Evidence cited.",
-            citations=[allowed, invalid],
+            citations=[_ALLOWED_CITATION, _INVALID_CITATION],
         )
-        updated, report = enforce_guardrails([hypothesis], allowed_citations=[allowed])
+        updated, report = enforce_guardrails([hypothesis], allowed_citations=[_ALLOWED_CITATION])
         self.assertEqual(report.citation_missing_count, 0)
         self.assertEqual(len(updated[0].citations), 1)
         self.assertEqual(updated[0].citations[0].excerpt_hash, "abc")
 
     def test_redacts_identifiers(self) -> None:
-        hypothesis = Hypothesis(
-            id="h1",
-            rank=1,
+        hypothesis = _hypothesis(
             confidence=0.7,
             explanation="Failure in arn:aws:iam::123456789012:role/Admin.",
-            citations=[],
         )
         updated, report = enforce_guardrails([hypothesis], allowed_citations=[])
         self.assertGreaterEqual(report.redactions, 1)
         self.assertIn("[REDACTED_IDENTIFIER]", updated[0].explanation)
         self.assertLessEqual(updated[0].confidence, 0.2)
 
+    def test_redacts_every_identifier_in_a_long_explanation(self) -> None:
+        explanation = " ".join(f"Failure in arn:aws:iam::{idx:012d}:role/Admin." for idx in range(1000))
+        hypothesis = _hypothesis(confidence=0.7, explanation=explanation)
+        updated, report = enforce_guardrails([hypothesis], allowed_citations=[])
+        self.assertGreaterEqual(report.redactions, 1000)
+        self.assertNotIn("arn:aws", updated[0].explanation)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -1,25 +1,22 @@
-import os
-import sys
 import unittest
 
-CURRENT_DIR = os.path.dirname(__file__)
-PROJECT_ROOT = os.path.abspath(os.path.join(CURRENT_DIR, ".."))
-sys.path.append(PROJECT_ROOT)
+import _bootstrap  # noqa: F401
+from app.llm.json_utils import extract_json
 
-from app.llm.json_utils import extract_json  # noqa: E402
+EXTRACT_JSON_CASES = (
+    ("prefix {\"ok\": true, \"value\": 1} suffix", {"ok": True, "value": 1}),
+    ("{\"status\": \"ok\"}", {"status": "ok"}),
+    ("here you go {\"a\": {\"b\": 1}, \"c\": \"cut off", {"a": {"b": 1}, "c": "cut off"}),
+    ("{\"pattern\": \"\\d+\"}", {"pattern": "\\d+"}),
+    ("{\"a\": \"x\" \"b\": \"y\"}", {"a": "x", "b": "y"}),
+)
 
 
 class JsonUtilsTests(unittest.TestCase):
-    def test_extracts_wrapped_json(self) -> None:
-        text = "prefix {\"ok\": true, \"value\": 1} suffix"
-        data = extract_json(text)
-        self.assertEqual(data["ok"], True)
-        self.assertEqual(data["value"], 1)
-
-    def test_extracts_plain_json(self) -> None:
-        text = "{\"status\": \"ok\"}"
-        data = extract_json(text)
-        self.assertEqual(data["status"], "ok")
+    def test_extract_json(self) -> None:
+        for text, expected in EXTRACT_JSON_CASES:
+            with self.subTest(text=text):
+                self.assertEqual(extract_json(text), expected)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,279 @@
+import queue
+import random
+import unittest
+from math import floor
+
+import _bootstrap  # noqa: F401
+from app.observability import (
+    CloudWatchMetrics,
+    RollingCacheHitRate,
+    RollingPercentiles,
+    RollingRequestWindow,
+    RollingWindowCounter,
+    _chunk_metric_data,
+)
+
+
+def _reference_percentile(values: list, p: int) -> float:
+    data = sorted(values)
+    rank = (p / 100) * (len(data) - 1)
+    low = floor(rank)
+    high = min(low + 1, len(data) - 1)
+    return data[low] + (data[high] - data[low]) * (rank - low)
+
+
+class RollingPercentilesTests(unittest.TestCase):
+    def test_empty_window_returns_none(self) -> None:
+        tracker = RollingPercentiles(max_samples=5)
+        self.assertEqual(tracker.percentiles([50, 95]), {"p50": None, "p95": None})
+
+    def test_single_sample(self) -> None:
+        tracker = RollingPercentiles(max_samples=5)
+        tracker.add(12.5)
+        self.assertEqual(tracker.percentiles([50, 95]), {"p50": 12.5, "p95": 12.5})
+
+    def test_matches_sorted_window_after_eviction(self) -> None:
+        rng = random.Random(7)
+        tracker = RollingPercentiles(max_samples=20)
+        samples = [rng.uniform(1, 500) for _ in range(75)]
+        for value in samples:
+            tracker.add(value)
+        window = samples[-20:]
+        result = tracker.percentiles([50, 95, 99])
+        self.assertEqual(tracker.count(), 20)
+        for p in (50, 95, 99):
+            self.assertAlmostEqual(result[f"p{p}"], _reference_percentile(window, p))
+
+    def test_cached_result_refreshes_after_add(self) -> None:
+        tracker = RollingPercentiles(max_samples=5)
+        tracker.add(10.0)
+        first = tracker.percentiles([50])
+        first["p50"] = -1.0
+        self.assertEqual(tracker.percentiles([50]), {"p50": 10.0})
+        tracker.add(20.0)
+        self.assertEqual(tracker.percentiles([50]), {"p50": 15.0})
+
+    def test_duplicate_values_evict_cleanly(self) -> None:
+        tracker = RollingPercentiles(max_samples=3)
+        for value in (5.0, 5.0, 5.0, 1.0, 1.0, 1.0):
+            tracker.add(value)
+        self.assertEqual(tracker.percentiles([50]), {"p50": 1.0})
+
+
+class RollingCacheHitRateTests(unittest.TestCase):
+    def test_rate_tracks_only_the_latest_window(self) -> None:
+        tracker = RollingCacheHitRate(max_samples=4)
+        self.assertIsNone(tracker.rate())
+        for hit in (True, True, False, True, False, False):
+            tracker.add(hit)
+        self.assertEqual(tracker.count(), 4)
+        self.assertEqual(tracker.rate(), 0.25)
+
+
+class RollingWindowCounterTests(unittest.TestCase):
+    def test_counts_weighted_adds_and_prunes_expired(self) -> None:
+        counter = RollingWindowCounter(window_seconds=60)
+        counter.add(5000)
+        self.assertEqual(counter.count(), 5000)
+        self.assertEqual(len(counter.values), 1)
+
+        counter.values[0] = (counter.values[0][0] - 120, counter.values[0][1])
+        counter.add()
+        self.assertEqual(counter.count(), 1)
+
+
+    def test_bursts_share_one_bucket_per_second(self) -> None:
+        counter = RollingWindowCounter(window_seconds=60)
+        for _ in range(1000):
+            counter.add()
+        self.assertEqual(counter.count(), 1000)
+        self.assertLessEqual(len(counter.values), 2)
+
+
+class RollingRequestWindowTests(unittest.TestCase):
+    def test_error_rate_drops_expired_errors(self) -> None:
+        window = RollingRequestWindow(window_seconds=60)
+        self.assertIsNone(window.error_rate())
+        for status_code in (500, 200, 404, 200):
+            window.add(status_code)
+        self.assertEqual(window.error_rate(), 0.5)
+
+        window.values[0] = (window.values[0][0] - 120, window.values[0][1])
+        self.assertAlmostEqual(window.error_rate(), 1 / 3)
+
+
+class _RecordingClient:
+    def __init__(self) -> None:
+        self.calls: list = []
+
+    def put_metric_data(self, *, Namespace: str, MetricData: list) -> None:
+        self.calls.append((Namespace, list(MetricData)))
+
+
+class _QueryClient:
+    def __init__(self, failures: int = 0) -> None:
+        self.calls = 0
+        self.failures = failures
+
+    def get_metric_data(self, **kwargs) -> dict:
+        self.calls += 1
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("Throttling")
+        return {"MetricDataResults": [{"Id": "cache_hit_rate", "Values": [0.5]}]}
+
+
+class _Paginator:
+    def __init__(self, calls: list) -> None:
+        self.calls = calls
+
+    def paginate(self, **kwargs):
+        self.calls.append(len(kwargs["MetricDataQueries"]))
+        for query in kwargs["MetricDataQueries"]:
+            if query["Id"] == "req_0":
+                yield {"MetricDataResults": [{"Id": "req_0", "Values": [10.0]}, {"Id": "err_0", "Values": []}]}
+                yield {"MetricDataResults": [{"Id": "req_0", "Values": [4.0]}, {"Id": "err_0", "Values": [2.0]}]}
+
+
+class _PagingClient:
+    def __init__(self) -> None:
+        self.calls: list = []
+
+    def get_paginator(self, name: str) -> _Paginator:
+        return _Paginator(self.calls)
+
+
+class CloudWatchPaginationTests(unittest.TestCase):
+    def test_queries_are_chunked_and_pages_merged(self) -> None:
+        metrics = CloudWatchMetrics()
+        metrics.enabled = True
+        metrics.client = _PagingClient()
+        endpoints = [f"/e{idx}" for idx in range(300)]
+        self.assertEqual(metrics.get_api_error_rate(endpoints=endpoints), 0.2)
+        self.assertEqual(metrics.client.calls, [500, 100])
+
+
+class _ExpressionPaginator:
+    def __init__(self, queries: list) -> None:
+        self.queries = queries
+
+    def paginate(self, **kwargs):
+        self.queries.extend(kwargs["MetricDataQueries"])
+        yield {
+            "MetricDataResults": [
+                {"Id": "p50_max_0", "Values": [120.0, 90.0]},
+                {"Id": "p95_max_0", "Values": []},
+            ]
+        }
+
+
+class _ExpressionClient:
+    def __init__(self) -> None:
+        self.queries: list = []
+
+    def get_paginator(self, name: str) -> _ExpressionPaginator:
+        return _ExpressionPaginator(self.queries)
+
+
+class CloudWatchLatencyExpressionTests(unittest.TestCase):
+    def test_percentiles_are_maxed_server_side(self) -> None:
+        metrics = CloudWatchMetrics()
+        metrics.enabled = True
+        metrics.client = _ExpressionClient()
+        result = metrics.get_llm_latency_percentiles(endpoints=["triage", "explain"])
+        self.assertEqual(result, {"p50": 120.0, "p95": None})
+
+        returned = [query for query in metrics.client.queries if query["ReturnData"]]
+        self.assertEqual(
+            [query["Expression"] for query in returned],
+            [
+                "MAX([FILL(p50_0, REPEAT), FILL(p50_1, REPEAT)])",
+                "MAX([FILL(p95_0, REPEAT), FILL(p95_1, REPEAT)])",
+            ],
+        )
+
+
+class CloudWatchQueryCacheTests(unittest.TestCase):
+    def test_repeated_queries_within_period_hit_local_cache(self) -> None:
+        metrics = CloudWatchMetrics()
+        metrics.enabled = True
+        metrics.client = _QueryClient()
+        self.assertEqual(metrics.get_cache_hit_rate(minutes=5, period=300), 0.5)
+        self.assertEqual(metrics.get_cache_hit_rate(minutes=5, period=300), 0.5)
+        self.assertEqual(metrics.client.calls, 1)
+
+        metrics.get_cache_hit_rate(endpoint="triage", minutes=5, period=300)
+        self.assertEqual(metrics.client.calls, 2)
+
+    def test_failed_queries_are_not_cached(self) -> None:
+        metrics = CloudWatchMetrics()
+        metrics.enabled = True
+        metrics.client = _QueryClient(failures=1)
+        self.assertIsNone(metrics.get_cache_hit_rate(minutes=5, period=300))
+        self.assertEqual(metrics.get_cache_hit_rate(minutes=5, period=300), 0.5)
+        self.assertEqual(metrics.client.calls, 2)
+
+
+class CloudWatchBatchingTests(unittest.TestCase):
+    def _metrics(self) -> CloudWatchMetrics:
+        metrics = CloudWatchMetrics()
+        metrics.enabled = True
+        metrics.client = _RecordingClient()
+        return metrics
+
+    def test_put_calls_are_buffered_until_flush(self) -> None:
+        metrics = self._metrics()
+        metrics.put_api_metrics(endpoint="/triage", status_code=200, latency_ms=12.0)
+        metrics.put_cache_metrics(endpoint="explain", hit=True)
+        metrics.put_budget_denied()
+        self.assertEqual(metrics.client.calls, [])
+
+        metrics.flush()
+        self.assertEqual(len(metrics.client.calls), 1)
+        _, data = metrics.client.calls[0]
+        self.assertEqual(len(data), 6)
+        self.assertTrue(all("Timestamp" in datum for datum in data))
+
+        metrics.flush()
+        self.assertEqual(len(metrics.client.calls), 1)
+
+    def test_close_stops_loop_and_flushes(self) -> None:
+        metrics = self._metrics()
+        metrics.put_budget_denied()
+        metrics.close()
+        self.assertTrue(metrics._stop.is_set())
+        self.assertEqual(len(metrics.client.calls), 1)
+
+    def test_full_queue_drops_and_reports_count(self) -> None:
+        metrics = self._metrics()
+        metrics._queue = queue.Queue(maxsize=1)
+        metrics.put_cache_metrics(endpoint="explain", hit=False)
+        metrics.put_cache_metrics(endpoint="explain", hit=False)
+        metrics.put_budget_denied()
+
+        metrics.flush()
+        _, data = metrics.client.calls[0]
+        dropped = [datum for datum in data if datum["MetricName"] == "MetricsDropped"]
+        self.assertEqual(len(data), 3)
+        self.assertEqual(dropped[0]["Values"], [2.0])
+
+    def test_flush_aggregates_repeated_samples(self) -> None:
+        metrics = self._metrics()
+        for latency in (10.0, 10.0, 25.0):
+            metrics.put_api_metrics(endpoint="/triage", status_code=200, latency_ms=latency)
+        metrics.flush()
+        _, data = metrics.client.calls[0]
+        by_name = {datum["MetricName"]: datum for datum in data}
+        self.assertEqual(len(data), 3)
+        self.assertEqual(by_name["APILatencyMs"]["Values"], [10.0, 25.0])
+        self.assertEqual(by_name["APILatencyMs"]["Counts"], [2.0, 1.0])
+        self.assertEqual(by_name["APIRequestCount"]["Counts"], [3.0])
+
+    def test_chunks_respect_datum_limit(self) -> None:
+        data = [{"MetricName": "APIRequestCount", "Unit": "Count", "Value": 1} for _ in range(2500)]
+        chunks = list(_chunk_metric_data(data))
+        self.assertEqual([len(chunk) for chunk in chunks], [1000, 1000, 500])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,90 +1,101 @@
 import hashlib
 import os
-import sys
 import unittest
-
-
-CURRENT_DIR = os.path.dirname(__file__)
-PROJECT_ROOT = os.path.abspath(os.path.join(CURRENT_DIR, ".."))
-FIXTURE_DIR = os.path.join(CURRENT_DIR, "fixtures")
-
-sys.path.append(PROJECT_ROOT)
-
-from app.parser import RuleBasedLogParser  # noqa: E402
-
-
-def _read_fixture(name: str) -> str:
-    path = os.path.join(FIXTURE_DIR, name)
-    with open(path, "r", encoding="utf-8") as handle:
-        return handle.read()
-
-
+from functools import lru_cache
+from typing import Dict
+
+import _bootstrap  # noqa: F401
+from app.parser import RuleBasedLogParser
+
+FIXTURE_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+
+
+def _read_fixtures() -> Dict[str, str]:
+    fixtures: Dict[str, str] = {}
+    for name in os.listdir(FIXTURE_DIR):
+        with open(os.path.join(FIXTURE_DIR, name), "r", encoding="utf-8") as handle:
+            fixtures[name] = handle.read()
+    return fixtures
+
+
+# (fixture, request_id, primary signature, primary line, infra component, time window, min secondary signatures)
+FIXTURE_CASES = (
+    (
+        "terraform.log",
+        "req-1",
+        "2026-01-30T11:23:45Z Error: Error creating IAM Role example-role: AccessDenied: User is not authorized",
+        1,
+        "terraform",
+        ("2026-01-30T11:23:45Z", "2026-01-30T11:23:45Z"),
+        0,
+    ),
+    (
+        "cloudwatch.log",
+        "req-2",
+        "2026-01-30 11:24:01Z ERROR Failed to deliver logs to destination",
+        2,
+        "cloudwatch",
+        ("2026-01-30 11:24:00Z", "2026-01-30 11:24:02Z"),
+        0,
+    ),
+    ("python_traceback.log", "req-3", "ValueError: bad input", 6, None, None, 1),
+    ("generic.log", "req-4", "Upstream request failed after 2 retries", 1, None, None, 0),
+)
+
+
+@lru_cache(maxsize=None)
 def _hash_line(text: str) -> str:
     return hashlib.sha256(text.encode("utf-8")).hexdigest()
 
 
 class ParserFixtureTests(unittest.TestCase):
-    def setUp(self):
-        self.parser = RuleBasedLogParser()
-
-    def test_terraform_parser(self):
-        raw_text = _read_fixture("terraform.log")
-        frame = self.parser.parse(raw_text, request_id="req-1")
-
-        expected_primary = "2026-01-30T11:23:45Z Error: Error creating IAM Role example-role: AccessDenied: User is not authorized"
-        self.assertEqual(frame.primary_error_signature, expected_primary)
-        self.assertIn("terraform", frame.infra_components)
-        self.assertIsNotNone(frame.time_window)
-        self.assertEqual(frame.time_window.start, "2026-01-30T11:23:45Z")
-        self.assertEqual(frame.time_window.end, "2026-01-30T11:23:45Z")
-
-        primary_evidence = frame.evidence_map[0]
-        self.assertEqual(primary_evidence.line_start, 1)
-        self.assertEqual(primary_evidence.line_end, 1)
-        self.assertEqual(primary_evidence.excerpt_hash, _hash_line(expected_primary))
-        self.assertEqual(primary_evidence.excerpt, expected_primary)
-
-    def test_cloudwatch_parser(self):
-        raw_text = _read_fixture("cloudwatch.log")
-        frame = self.parser.parse(raw_text, request_id="req-2")
-
-        expected_primary = "2026-01-30 11:24:01Z ERROR Failed to deliver logs to destination"
-        self.assertEqual(frame.primary_error_signature, expected_primary)
-        self.assertIn("cloudwatch", frame.infra_components)
-        self.assertIsNotNone(frame.time_window)
-        self.assertEqual(frame.time_window.start, "2026-01-30 11:24:00Z")
-        self.assertEqual(frame.time_window.end, "2026-01-30 11:24:02Z")
-
-        primary_evidence = frame.evidence_map[0]
-        self.assertEqual(primary_evidence.line_start, 2)
-        self.assertEqual(primary_evidence.line_end, 2)
-        self.assertEqual(primary_evidence.excerpt_hash, _hash_line(expected_primary))
-        self.assertEqual(primary_evidence.excerpt, expected_primary)
-
-    def test_python_traceback_parser(self):
-        raw_text = _read_fixture("python_traceback.log")
-        frame = self.parser.parse(raw_text, request_id="req-3")
-
-        expected_primary = "ValueError: bad input"
-        self.assertEqual(frame.primary_error_signature, expected_primary)
-        self.assertGreaterEqual(len(frame.secondary_signatures), 1)
-
-        primary_evidence = frame.evidence_map[0]
-        self.assertEqual(primary_evidence.line_start, 6)
-        self.assertEqual(primary_evidence.line_end, 6)
-        self.assertEqual(primary_evidence.excerpt_hash, _hash_line(expected_primary))
-        self.assertEqual(primary_evidence.excerpt, expected_primary)
-
-    def test_generic_parser(self):
-        raw_text = _read_fixture("generic.log")
-        frame = self.parser.parse(raw_text, request_id="req-4")
-
-        expected_primary = "Upstream request failed after 2 retries"
-        self.assertEqual(frame.primary_error_signature, expected_primary)
-        self.assertEqual(frame.evidence_map[0].line_start, 1)
-        self.assertEqual(frame.evidence_map[0].line_end, 1)
-        self.assertEqual(frame.evidence_map[0].excerpt_hash, _hash_line(expected_primary))
-        self.assertEqual(frame.evidence_map[0].excerpt, expected_primary)
+    @classmethod
+    def setUpClass(cls):
+        cls.parser = RuleBasedLogParser()
+        cls.fixtures = _read_fixtures()
+
+    def test_fixture_parsers(self):
+        for name, request_id, expected_primary, line, component, window, min_secondary in FIXTURE_CASES:
+            with self.subTest(fixture=name):
+                frame = self.parser.parse(self.fixtures[name], request_id=request_id)
+
+                self.assertEqual(frame.primary_error_signature, expected_primary)
+                if component:
+                    self.assertIn(component, frame.infra_components)
+                if window:
+                    self.assertIsNotNone(frame.time_window)
+                    self.assertEqual((frame.time_window.start, frame.time_window.end), window)
+                self.assertGreaterEqual(len(frame.secondary_signatures), min_secondary)
+
+                primary_evidence = frame.evidence_map[0]
+                self.assertEqual(primary_evidence.line_start, line)
+                self.assertEqual(primary_evidence.line_end, line)
+                self.assertEqual(primary_evidence.excerpt_hash, _hash_line(expected_primary))
+                self.assertEqual(primary_evidence.excerpt, expected_primary)
+
+    def test_repeated_paste_reuses_parse_with_fresh_ids(self):
+        parser = RuleBasedLogParser()
+        raw_text = self.fixtures["terraform.log"]
+        first = parser.parse(raw_text, request_id="req-5", conversation_id="conv-1")
+        second = parser.parse(raw_text, request_id="req-6")
+
+        self.assertEqual(len(parser._cache), 1)
+        self.assertNotEqual(first.frame_id, second.frame_id)
+        self.assertEqual(second.request_id, "req-6")
+        self.assertIsNone(second.conversation_id)
+        self.assertEqual(first.primary_error_signature, second.primary_error_signature)
+        self.assertEqual(first.evidence_map, second.evidence_map)
+        self.assertIsNot(first.evidence_map[0], second.evidence_map[0])
+
+    def test_large_paste_scans_head_and_tail_only(self):
+        lines = [f"2026-01-30T11:00:00Z INFO request {idx} ok" for idx in range(6000)]
+        lines[2999] = "2026-01-30T11:30:00Z Error: middle failure"
+        lines[5499] = "2026-01-30T11:59:00Z Error: tail failure"
+        frame = self.parser.parse("\n".join(lines), request_id="req-7")
+
+        self.assertEqual(frame.primary_error_signature, "2026-01-30T11:59:00Z Error: tail failure")
+        self.assertEqual(frame.evidence_map[0].line_start, 5500)
+        self.assertEqual(frame.parse_confidence, 0.45)
 
 
 if __name__ == "__main__":
@@ -1,12 +1,7 @@
-import os
-import sys
 import unittest
 
-CURRENT_DIR = os.path.dirname(__file__)
-PROJECT_ROOT = os.path.abspath(os.path.join(CURRENT_DIR, ".."))
-sys.path.append(PROJECT_ROOT)
-
-from app.utils.guardrail_utils import missing_required_details, rephrase_missing_details  # noqa: E402
+import _bootstrap  # noqa: F401
+from app.utils.guardrail_utils import missing_required_details, rephrase_missing_details
 
 
 class QuestionHandlingTests(unittest.TestCase):
@@ -29,7 +24,8 @@ class QuestionHandlingTests(unittest.TestCase):
 
 
     def test_rephrase_missing_details_payload(self) -> None:
-        self.assertIn("request payload", rephrase_missing_details(["request payload"]).lower())
+        message = rephrase_missing_details(["request payload"])
+        self.assertTrue(message.startswith("I still need the request payload."), message)
 
 
 if __name__ == "__main__":
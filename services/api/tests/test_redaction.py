@@ -1,12 +1,16 @@
-import os
-import sys
 import unittest
 
-CURRENT_DIR = os.path.dirname(__file__)
-PROJECT_ROOT = os.path.abspath(os.path.join(CURRENT_DIR, ".."))
-sys.path.append(PROJECT_ROOT)
+import _bootstrap  # noqa: F401
+from app.utils.redaction_utils import redact_sensitive_text
 
-from app.utils.redaction_utils import redact_sensitive_text  # noqa: E402
+REDACTION_CASES = (
+    ("passport no A1234567", "[PASSPORT_NUMBER]"),
+    ("driver's license: D123-456-789", "[DRIVER_LICENSE]"),
+    ("EIN: 12-3456789", "[BUSINESS_NUMBER]"),
+    ("device mac 00:1A:2B:3C:4D:5E", "[MAC_ADDRESS]"),
+    ("switch mac 001A.2B3C.4D5E", "[MAC_ADDRESS]"),
+    ("card 4111 1111 1111 1111 on file", "[CREDIT_CARD]"),
+)
 
 
 class RedactionTests(unittest.TestCase):
@@ -15,20 +19,21 @@ class RedactionTests(unittest.TestCase):
         self.assertIn(expected, redacted)
         self.assertGreaterEqual(hits, 1)
 
-    def test_redacts_passport(self) -> None:
-        self.assertRedacts("passport no A1234567", "[PASSPORT_NUMBER]")
-
-    def test_redacts_driver_license(self) -> None:
-        self.assertRedacts("driver's license: D123-456-789", "[DRIVER_LICENSE]")
-
-    def test_redacts_business_number(self) -> None:
-        self.assertRedacts("EIN: 12-3456789", "[BUSINESS_NUMBER]")
-
-    def test_redacts_mac_address(self) -> None:
-        self.assertRedacts("device mac 00:1A:2B:3C:4D:5E", "[MAC_ADDRESS]")
-
-    def test_redacts_mac_address_cisco(self) -> None:
-        self.assertRedacts("switch mac 001A.2B3C.4D5E", "[MAC_ADDRESS]")
+    def test_redactions(self) -> None:
+        for text, expected in REDACTION_CASES:
+            with self.subTest(text=text):
+                self.assertRedacts(text, expected)
+
+    def test_redacts_every_case_in_one_large_input(self) -> None:
+        corpus = "\n".join(text for _ in range(32) for text, _ in REDACTION_CASES)
+        redacted, hits = redact_sensitive_text(corpus)
+        for _, expected in REDACTION_CASES:
+            self.assertGreaterEqual(redacted.count(expected), 32)
+        self.assertGreaterEqual(hits, 32 * len(REDACTION_CASES))
+
+    def test_keeps_luhn_invalid_digit_runs(self) -> None:
+        redacted, _ = redact_sensitive_text("order 4111 1111 1111 1112 shipped")
+        self.assertNotIn("[CREDIT_CARD]", redacted)
 
 
 if __name__ == "__main__":
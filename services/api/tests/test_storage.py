@@ -0,0 +1,222 @@
+import os
+import threading
+import unittest
+from datetime import datetime, timezone
+from unittest import mock
+
+import _bootstrap  # noqa: F401
+
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+
+from app import main  # noqa: E402
+from app.schemas import CanonicalResponse, IncidentFrame  # noqa: E402
+from app.storage import (  # noqa: E402
+    _BATCH_WRITE_MAX_ATTEMPTS,
+    DynamoDBStorage,
+    InMemoryStorage,
+    _dump,
+    _reuse_model_dumps,
+)
+
+
+class _FakeClient:
+    def __init__(self, unprocessed_once: bool = False) -> None:
+        self.puts: list = []
+        self.batches: list = []
+        self.unprocessed_once = unprocessed_once
+
+    def put_item(self, *, TableName: str, Item: dict) -> None:
+        self.puts.append((TableName, Item))
+
+    def _items(self, table_name: str) -> list:
+        return [dict(item) for name, item in self.puts if name == table_name]
+
+    def get_item(self, *, TableName: str, Key: dict) -> dict:
+        items = self._items(TableName)
+        return {"Item": items[-1]} if items else {}
+
+    def query(self, *, TableName: str, **kwargs) -> dict:
+        return {"Items": list(reversed(self._items(TableName)))}
+
+    def batch_write_item(self, *, RequestItems: dict) -> dict:
+        self.batches.append(RequestItems)
+        if self.unprocessed_once:
+            self.unprocessed_once = False
+            table_name = next(iter(RequestItems))
+            return {"UnprocessedItems": {table_name: RequestItems[table_name][:1]}}
+        return {"UnprocessedItems": {}}
+
+
+def _frame() -> IncidentFrame:
+    return IncidentFrame(
+        frame_id="frame-1",
+        conversation_id="conv-1",
+        request_id="req-1",
+        parser_version="v0.2",
+        parse_confidence=0.7,
+        created_at=datetime.now(timezone.utc),
+    )
+
+
+def _response() -> CanonicalResponse:
+    return CanonicalResponse(
+        request_id="req-1",
+        conversation_id="conv-1",
+        timestamp=datetime.now(timezone.utc),
+        assistant_message="Check the IAM policy.",
+        completion_state="final",
+    )
+
+
+class DynamoDBBatchWriteTests(unittest.TestCase):
+    def _storage(self, **kwargs) -> DynamoDBStorage:
+        storage = DynamoDBStorage()
+        storage.client = _FakeClient(**kwargs)
+        return storage
+
+    def test_writes_outside_batch_go_straight_to_put_item(self) -> None:
+        storage = self._storage()
+        storage.save_frame(_frame())
+        self.assertEqual([name for name, _ in storage.client.puts], [storage.inputs_table])
+        self.assertEqual(storage.client.batches, [])
+
+    def test_batch_coalesces_request_writes(self) -> None:
+        storage = self._storage()
+        frame, response = _frame(), _response()
+        with storage.batch_writes():
+            storage.save_response(response)
+            storage.save_frame(frame)
+            storage.save_event("conv-1", "req-1", "raw", frame, response, "input-1")
+            storage.update_conversation_state("conv-1", "req-1", frame, response)
+            self.assertEqual(storage.client.batches, [])
+
+        self.assertEqual(storage.client.puts, [])
+        self.assertEqual(len(storage.client.batches), 1)
+        batch = storage.client.batches[0]
+        self.assertEqual(len(batch[storage.inputs_table]), 2)
+        self.assertEqual(len(batch[storage.events_table]), 1)
+        self.assertEqual(len(batch[storage.state_table]), 1)
+
+    def test_unprocessed_items_are_retried(self) -> None:
+        storage = self._storage(unprocessed_once=True)
+        with storage.batch_writes():
+            storage.save_frame(_frame())
+        self.assertEqual(len(storage.client.batches), 2)
+        self.assertEqual(len(storage.client.batches[1][storage.inputs_table]), 1)
+
+    def test_exhausted_retries_raise_without_a_trailing_sleep(self) -> None:
+        storage = self._storage()
+        storage.client.batch_write_item = lambda *, RequestItems: {"UnprocessedItems": RequestItems}
+        with mock.patch("app.storage.time.sleep") as sleep:
+            with self.assertRaises(RuntimeError):
+                with storage.batch_writes():
+                    storage.save_frame(_frame())
+        self.assertEqual(sleep.call_count, _BATCH_WRITE_MAX_ATTEMPTS - 1)
+
+    def test_retried_input_reuses_stored_input_id(self) -> None:
+        storage = self._storage()
+        first = storage.save_input("conv-1", "req-1", "Error: boom")
+        retried = storage.save_input("conv-1", "req-1", "Error: boom")
+        edited = storage.save_input("conv-1", "req-1", "Error: boom again")
+
+        self.assertEqual(first, retried)
+        self.assertNotEqual(first, edited)
+        self.assertEqual(len(storage.client.puts), 4)
+
+    def test_frames_round_trip_as_json_blobs(self) -> None:
+        storage = self._storage()
+        frame, response = _frame(), _response()
+        storage.save_event("conv-1", "req-1", "raw", frame, response, "input-1")
+        storage.update_conversation_state("conv-1", "req-1", frame, response)
+
+        stored_event = storage.client.puts[0][1]
+        self.assertIsInstance(stored_event["incident_frame_json"]["S"], str)
+        self.assertNotIn("incident_frame", stored_event)
+
+        context = storage.get_conversation_context("conv-1")
+        self.assertEqual(context["state"]["latest_incident_frame"]["frame_id"], "frame-1")
+        self.assertEqual(context["recent_events"][0]["incident_frame"]["parse_confidence"], 0.7)
+        self.assertEqual(IncidentFrame.model_validate(context["state"]["latest_incident_frame"]), frame)
+
+
+class ConcurrentPersistTests(unittest.TestCase):
+    def test_concurrent_exchanges_flush_separate_batches(self) -> None:
+        storage = DynamoDBStorage()
+        client = storage.client = _FakeClient()
+        barrier = threading.Barrier(2, timeout=5)
+        batch_write_item = client.batch_write_item
+
+        def overlapping_batch_write_item(**kwargs) -> dict:
+            # Both requests are mid-flush before either batch is recorded.
+            barrier.wait()
+            return batch_write_item(**kwargs)
+
+        client.batch_write_item = overlapping_batch_write_item
+
+        def persist(idx: int) -> None:
+            ids = {"request_id": f"req-{idx}", "conversation_id": f"conv-{idx}"}
+            frame = _frame().model_copy(update={"frame_id": f"frame-{idx}", **ids})
+            response = _response().model_copy(update=ids)
+            main._persist_exchange(f"conv-{idx}", f"req-{idx}", "raw", frame, response, f"input-{idx}")
+
+        with mock.patch.object(main, "storage", storage):
+            threads = [threading.Thread(target=persist, args=(idx,)) for idx in range(2)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(len(client.batches), 2)
+        batch_conversations = [
+            {item["PutRequest"]["Item"]["conversation_id"]["S"] for items in batch.values() for item in items}
+            for batch in client.batches
+        ]
+        self.assertEqual(sorted(batch_conversations, key=sorted), [{"conv-0"}, {"conv-1"}])
+
+
+class ModelDumpReuseTests(unittest.TestCase):
+    def test_batch_reuses_dumps_for_serialization(self) -> None:
+        frame = _frame()
+        with _reuse_model_dumps():
+            self.assertIs(_dump(frame), _dump(frame))
+        self.assertIsNot(_dump(frame), _dump(frame))
+
+    def test_batched_in_memory_writes_store_independent_copies(self) -> None:
+        storage = InMemoryStorage()
+        frame, response = _frame(), _response()
+        with storage.batch_writes():
+            storage.save_event("conv-1", "req-1", "raw", frame, response, "input-1")
+            storage.update_conversation_state("conv-1", "req-1", frame, response)
+
+        event = storage.events["conv-1"][0]
+        state = storage.state["conv-1"]
+        self.assertEqual(event["incident_frame"], state["latest_incident_frame"])
+        self.assertIsNot(event["incident_frame"], state["latest_incident_frame"])
+        self.assertEqual(state["latest_response_summary"]["tool_calls"], [])
+
+    def test_dumps_are_not_shared_outside_a_batch(self) -> None:
+        storage = InMemoryStorage()
+        frame, response = _frame(), _response()
+        storage.save_event("conv-1", "req-1", "raw", frame, response, "input-1")
+        storage.update_conversation_state("conv-1", "req-1", frame, response)
+
+        self.assertIsNot(storage.events["conv-1"][0]["incident_frame"], storage.state["conv-1"]["latest_incident_frame"])
+
+
+class InMemoryBoundsTests(unittest.TestCase):
+    def test_oldest_entries_are_evicted(self) -> None:
+        storage = InMemoryStorage()
+        storage.max_items = 2
+        storage.max_events_per_conversation = 3
+        input_ids = [storage.save_input("conv-1", f"req-{idx}", "raw") for idx in range(3)]
+        for idx in range(5):
+            storage.save_event("conv-1", f"req-{idx}", "raw", _frame(), _response(), "input-1")
+
+        self.assertEqual(list(storage.inputs), input_ids[1:])
+        context = storage.get_conversation_context("conv-1", limit=2)
+        self.assertEqual([event["request_id"] for event in context["recent_events"]], ["req-3", "req-4"])
+        self.assertEqual(len(storage.events["conv-1"]), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()